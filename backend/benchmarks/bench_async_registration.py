@@ -0,0 +1,144 @@
+"""
+同時登録のベンチマーク（同期ビュー + スレッド vs 非同期ビュー）
+
+実行方法（Dockerコンテナ内）:
+  python benchmarks/bench_async_registration.py --latency 0.3 --concurrency 10,50,100
+
+外部APIを一定の遅延（--latency 秒）で応答する偽物に差し替え、同じ件数の書籍登録を
+  - 同期ビュー（views.py）を --threads 本のスレッドで処理した場合
+  - 非同期ビュー（async_views.py）を1つのイベントループで処理した場合
+で比較する。同期版はスレッド数で頭打ちになり、非同期版は同時数に比例して伸びる。
+登録した書籍はベンチマーク後に削除する。
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+import httpx  # noqa: E402
+from django.conf import settings  # noqa: E402
+from rest_framework.test import APIRequestFactory  # noqa: E402
+
+from books import async_views, views  # noqa: E402
+from books.models import Book  # noqa: E402
+
+# ベンチマーク用ISBNの接頭辞（seed_books の連番 979 + 9桁 のうち9000万番以降を使う）
+ISBN_PREFIX = '97909'
+
+NDL_XML = '''\
+<?xml version="1.0" encoding="UTF-8"?>
+<rss version="2.0"><channel><item><title>ベンチマークの本</title></item></channel></rss>
+'''.encode('utf-8')
+
+GOOGLE_JSON = {
+    'totalItems': 1,
+    'items': [{'volumeInfo': {'imageLinks': {'thumbnail': 'https://example.com/cover.jpg'}}}],
+}
+
+
+def _isbns(count, offset):
+    return [f'{ISBN_PREFIX}{offset + i:08d}' for i in range(count)]
+
+
+def run_sync(isbns, latency, threads):
+    """同期ビューをスレッドプールで実行する"""
+    factory = APIRequestFactory()
+
+    def fake_get(url, params=None, timeout=None):
+        time.sleep(latency)
+        response = MagicMock()
+        response.raise_for_status = MagicMock()
+        response.content = NDL_XML
+        response.json.return_value = GOOGLE_JSON
+        return response
+
+    def register(isbn):
+        request = factory.post('/api/books/', {'isbn': isbn}, format='json')
+        return views.book_list_create(request).status_code
+
+    with patch('books.services.requests.get', side_effect=fake_get):
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            statuses = list(executor.map(register, isbns))
+        return time.perf_counter() - start, statuses
+
+
+def run_async(isbns, latency):
+    """非同期ビューを1つのイベントループで同時に実行する"""
+    factory = APIRequestFactory()
+
+    async def handler(request):
+        await asyncio.sleep(latency)
+        if 'ndl' in request.url.host:
+            return httpx.Response(200, content=NDL_XML)
+        return httpx.Response(200, json=GOOGLE_JSON)
+
+    def client():
+        return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    async def register(isbn):
+        request = factory.post('/api/books/', {'isbn': isbn}, format='json')
+        return (await async_views.book_list_create(request)).status_code
+
+    async def main():
+        return await asyncio.gather(*(register(isbn) for isbn in isbns))
+
+    with patch('books.services.async_http_client', client):
+        start = time.perf_counter()
+        statuses = asyncio.run(main())
+        return time.perf_counter() - start, statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--latency', type=float, default=0.3,
+                        help='外部API1回あたりの遅延（秒）')
+    parser.add_argument('--threads', type=int, default=4,
+                        help='同期ビューを処理するスレッド数')
+    parser.add_argument('--concurrency', default='10,50,100',
+                        help='同時登録数（カンマ区切り）')
+    args = parser.parse_args()
+
+    # ベンチマークでは外部APIのレート制限を外す
+    settings.UPSTREAM_RATE_LIMITS = {}
+
+    print(f'外部APIの遅延 {args.latency}秒 × 2回/登録, 同期ビューのスレッド数 {args.threads}')
+    print(f'{"同時数":>6} | {"同期(秒)":>9} {"件/秒":>7} | {"非同期(秒)":>10} {"件/秒":>7} | スレッド数')
+    offset = 0
+    try:
+        for count in [int(c) for c in args.concurrency.split(',')]:
+            sync_isbns = _isbns(count, offset)
+            async_isbns = _isbns(count, offset + count)
+            offset += count * 2
+
+            sync_elapsed, sync_statuses = run_sync(sync_isbns, args.latency, args.threads)
+            threads_before = threading.active_count()
+            async_elapsed, async_statuses = run_async(async_isbns, args.latency)
+            threads_after = threading.active_count()
+
+            failures = [s for s in sync_statuses + async_statuses if s != 201]
+            print(
+                f'{count:>6} | {sync_elapsed:>9.2f} {count / sync_elapsed:>7.1f} | '
+                f'{async_elapsed:>10.2f} {count / async_elapsed:>7.1f} | '
+                f'{threads_before} -> {threads_after}'
+                + (f'  (失敗 {len(failures)}件)' if failures else '')
+            )
+    finally:
+        Book.objects.filter(isbn__startswith=ISBN_PREFIX).delete()
+
+
+if __name__ == '__main__':
+    main()
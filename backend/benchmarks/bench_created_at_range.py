@@ -0,0 +1,130 @@
+"""
+登録日時の範囲検索のベンチマーク（PostgreSQLのみ）
+
+実行方法（Dockerコンテナ内）:
+  python benchmarks/bench_created_at_range.py --seed 1000000
+
+一覧APIの since / until / month と同じ条件（created_at の範囲）で、次のクエリを
+EXPLAIN (ANALYZE, BUFFERS) し、使われたスキャンと実行時間を表示する。
+  - 件数       月ごとの登録件数（COUNT）
+  - 日時のみ   範囲内の登録日時だけを読む
+  - 一覧       一覧APIと同じ全列の取得（新しい順）
+それぞれ、プランナーの既定 / BRINのみ（インデックススキャンを無効化）/
+シーケンシャルスキャンのみ、の3通りで比較する。件数と日時のみのクエリは
+B-tree（book_created_at_idx）の Index Only Scan で、テーブル本体を読まずに済む。
+--seed を指定すると、先に seed_books コマンドでデータを投入する。
+"""
+
+import argparse
+import os
+import re
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.core.management import call_command  # noqa: E402
+from django.db import connection, transaction  # noqa: E402
+from django.db.models import Max, Min  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from books.models import Book  # noqa: E402
+from books.views import created_at_filters  # noqa: E402
+
+INDEXES = ('book_created_at_idx', 'book_created_at_brin_idx')
+
+# 比較するプランナーの設定
+VARIANTS = {
+    '既定': [],
+    'BRINのみ': ['enable_indexscan', 'enable_indexonlyscan'],
+    'シーケンシャル': ['enable_indexscan', 'enable_indexonlyscan', 'enable_bitmapscan'],
+}
+
+
+def _queries(filters):
+    books = Book.objects.filter(**filters)
+    return {
+        '件数': books.order_by().values('created_at'),  # _explain で COUNT(*) に包む
+        '日時のみ': books.order_by('-created_at').values_list('created_at'),
+        '一覧': books.order_by('-created_at'),
+    }
+
+
+def _explain(queryset, disabled, count=False):
+    """指定したスキャンを無効にして EXPLAIN ANALYZE し、(スキャン, 実行時間ms, Heap Fetches) を返す"""
+    with transaction.atomic(), connection.cursor() as cursor:
+        for setting in disabled:
+            cursor.execute(f'SET LOCAL {setting} = off')
+        if count:
+            sql, params = queryset.query.sql_with_params()
+            cursor.execute(
+                f'EXPLAIN (ANALYZE, BUFFERS) SELECT COUNT(*) FROM ({sql}) AS subquery', params,
+            )
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+        else:
+            plan = queryset.explain(analyze=True, buffers=True)
+
+    scan = next((line.strip().lstrip('-> ') for line in plan.splitlines() if 'Scan' in line), '?')
+    scan = re.sub(r'\s+\(cost=.*', '', scan)
+    elapsed = float(re.search(r'Execution Time: ([\d.]+) ms', plan).group(1))
+    heap_fetches = re.search(r'Heap Fetches: (\d+)', plan)
+    return scan, elapsed, heap_fetches.group(1) if heap_fetches else '-'
+
+
+def _month_in_middle():
+    """データの登録期間の中ほどの月（YYYY-MM）を返す"""
+    bounds = Book.objects.aggregate(first=Min('created_at'), last=Max('created_at'))
+    middle = bounds['first'] + (bounds['last'] - bounds['first']) / 2
+    return timezone.localtime(middle).strftime('%Y-%m')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--seed', type=int, default=0,
+                        help='先に seed_books で投入する件数')
+    parser.add_argument('--start', type=int, default=0,
+                        help='seed_books に渡すISBNの連番の開始値')
+    parser.add_argument('--month', default=None,
+                        help='検索する月（YYYY-MM, 省略時はデータの中ほどの月）')
+    args = parser.parse_args()
+
+    if connection.vendor != 'postgresql':
+        sys.exit('このベンチマークにはPostgreSQLが必要です')
+
+    if args.seed:
+        call_command('seed_books', count=args.seed, start=args.start)
+    with connection.cursor() as cursor:
+        # Index Only Scan には可視性マップ、BRINにはブロック範囲の要約が必要
+        cursor.execute('VACUUM ANALYZE books_book')
+        cursor.execute(
+            'SELECT indexrelname, pg_relation_size(indexrelid) FROM pg_stat_user_indexes '
+            'WHERE indexrelname = ANY(%s)', [list(INDEXES)],
+        )
+        sizes = dict(cursor.fetchall())
+
+    total = Book.objects.count()
+    if not total:
+        sys.exit('書籍がありません。--seed で投入してください')
+    month = args.month or _month_in_middle()
+    filters = created_at_filters({'month': month})
+    matched = Book.objects.filter(**filters).count()
+
+    print(f'書籍 {total}件 / month={month} に該当 {matched}件')
+    for name in INDEXES:
+        size = sizes.get(name)
+        print(f'  {name}: ' + (f'{size / 1024:.0f} KiB' if size is not None else 'なし'))
+    print()
+    print(f'{"クエリ":<6} {"設定":<8} {"時間(ms)":>9} {"Heap Fetches":>12}  スキャン')
+    for label, queryset in _queries(filters).items():
+        for variant, disabled in VARIANTS.items():
+            scan, elapsed, heap_fetches = _explain(queryset, disabled, count=label == '件数')
+            print(f'{label:<6} {variant:<8} {elapsed:>9.2f} {heap_fetches:>12}  {scan}')
+
+
+if __name__ == '__main__':
+    main()
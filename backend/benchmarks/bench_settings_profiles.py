@@ -0,0 +1,131 @@
+"""
+設定プロファイルのベンチマーク（config.settings vs config.settings_api）
+
+実行方法（Dockerコンテナ内）:
+  python benchmarks/bench_settings_profiles.py --runs 10 --requests 5000
+
+設定ごとに別プロセスを起動し、次の2つを比較する。
+  - 起動時間: django.setup() からWSGIアプリケーションの作成・URL設定の読み込みまで
+    （Pythonインタプリタ自体の起動は含めない）
+  - 1リクエストあたりの時間: WSGIハンドラ経由（ミドルウェアを含む）とビューの直接呼び出しの差を
+    ミドルウェア等のオーバーヘッドとする
+既定の対象 /api/books/search/?q= はDBにアクセスしないため、DBの速度に左右されない。
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+PROFILES = {
+    '従来': 'config.settings',
+    'API専用': 'config.settings_api',
+}
+
+# 1リクエストあたりの時間を計測する回数（最も速い回を使う）
+ROUNDS = 5
+
+
+def child_startup():
+    """起動時間を計測する（子プロセスで実行）"""
+    started = time.perf_counter()
+    import django
+
+    django.setup()
+    from django.core.wsgi import get_wsgi_application
+    from django.urls import get_resolver
+
+    get_wsgi_application()
+    get_resolver().url_patterns
+    elapsed = time.perf_counter() - started
+    print(json.dumps({'startup': elapsed, 'modules': len(sys.modules)}))
+
+
+def child_requests(path, count):
+    """WSGIハンドラ経由とビュー直接呼び出しの1リクエストあたりの時間を計測する（子プロセスで実行）"""
+    import django
+
+    django.setup()
+    from django.core.handlers.wsgi import WSGIHandler
+    from django.test import RequestFactory
+    from django.urls import resolve
+
+    factory = RequestFactory()
+    handler = WSGIHandler()
+    match = resolve(path.split('?')[0])
+
+    def start_response(status, headers):
+        pass
+
+    def via_handler():
+        handler(factory.get(path).environ, start_response)
+
+    def direct():
+        match.func(factory.get(path), *match.args, **match.kwargs)
+
+    results = {}
+    for name, func in (('handler', via_handler), ('direct', direct)):
+        for _ in range(min(count, 200)):  # ウォームアップ
+            func()
+        # 他のプロセスの影響を減らすため、数回に分けて計測し最も速い回を使う
+        rounds = []
+        for _ in range(ROUNDS):
+            started = time.perf_counter()
+            for _ in range(count // ROUNDS):
+                func()
+            rounds.append((time.perf_counter() - started) / (count // ROUNDS))
+        results[name] = min(rounds)
+    print(json.dumps(results))
+
+
+def _run_child(settings_module, *args):
+    env = {**os.environ, 'DJANGO_SETTINGS_MODULE': settings_module}
+    output = subprocess.run(
+        [sys.executable, __file__, '--child', *args],
+        cwd=BACKEND_DIR, env=env, check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10,
+                        help='起動時間を計測する回数（中央値を表示）')
+    parser.add_argument('--requests', type=int, default=5000,
+                        help='1リクエストあたりの時間を計測するリクエスト数')
+    parser.add_argument('--path', default='/api/books/search/?q=',
+                        help='計測に使うURL（GET）')
+    parser.add_argument('--child', nargs='+', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        sys.path.insert(0, str(BACKEND_DIR))
+        if args.child[0] == 'startup':
+            child_startup()
+        else:
+            child_requests(args.child[1], int(args.child[2]))
+        return
+
+    print(f'起動時間: {args.runs}回の中央値 / 1リクエスト: {args.path} を {args.requests}回')
+    print(f'{"設定":<8} | {"起動(ms)":>9} {"モジュール数":>11} | '
+          f'{"ハンドラ(µs)":>12} {"ビュー(µs)":>10} {"差分(µs)":>9}')
+    for label, settings_module in PROFILES.items():
+        startups = [_run_child(settings_module, 'startup') for _ in range(args.runs)]
+        startup = statistics.median(s['startup'] for s in startups)
+        per_request = _run_child(settings_module, 'requests', args.path, str(args.requests))
+        overhead = per_request['handler'] - per_request['direct']
+        print(
+            f'{label:<8} | {startup * 1000:>9.1f} {startups[0]["modules"]:>11} | '
+            f'{per_request["handler"] * 1e6:>12.1f} {per_request["direct"] * 1e6:>10.1f} '
+            f'{overhead * 1e6:>9.1f}'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+"""
+書籍APIの非同期ビュー（ASGI用）
+
+views.py の book_list_create / book_search / book_delete / lookup_preview と同じ振る舞いを
+async def で実装したもの。外部APIの待ち時間中もワーカースレッドを占有しない。
+入力の検証とレスポンスの組み立ては views.py の関数を共有し、ここではDBアクセスと
+外部APIの待ち合わせだけを非同期で行う。
+config/asgi.py から起動した場合（BOOKS_ASYNC_VIEWS=1）に books/urls.py で使われる。
+"""
+
+import json
+
+import requests
+from django.http import HttpResponse, JsonResponse
+from rest_framework import status
+
+from .idempotency import idempotent
+from .lookup_cache import ashared_lookup
+from .models import Book
+from .serializers import BookSerializer
+from .services import alookup_book_by_isbn
+from .views import (
+    BOOK_LIST_ORDERINGS,
+    create_error,
+    created_at_filters,
+    duplicate_error,
+    invalid_isbn_error,
+    lookup_error,
+    new_book_fields,
+    not_found_error,
+    preview_result,
+    validated_isbn,
+)
+
+
+def _response(data, status_code=status.HTTP_200_OK):
+    return JsonResponse(
+        data, status=status_code, safe=False, json_dumps_params={'ensure_ascii': False},
+    )
+
+
+def _method_not_allowed(request):
+    return _response(
+        {'detail': f'Method "{request.method}" not allowed.'},
+        status.HTTP_405_METHOD_NOT_ALLOWED,
+    )
+
+
+def _csrf_exempt(view_func):
+    """DRFの api_view と同様にCSRFチェックを外す
+
+    Django 4.2 の csrf_exempt は非同期ビューを同期関数で包んでしまうため属性だけを設定する。
+    """
+    view_func.csrf_exempt = True
+    return view_func
+
+
+def _parse_body(request):
+    """JSONまたはフォームのリクエスト本文を取り出す（不正なJSONの場合None）"""
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            return None
+        return data if isinstance(data, dict) else None
+    return request.POST
+
+
+@_csrf_exempt
+async def book_list_create(request):
+    """書籍一覧・登録"""
+    if request.method == 'GET':
+        return await _book_list(request)
+    if request.method == 'POST':
+        request.data = _parse_body(request)
+        return await _book_create(request)
+    return _method_not_allowed(request)
+
+
+@idempotent
+async def _book_create(request):
+    """書籍登録: ISBN受取→外部API検索→DB保存→結果返却"""
+    isbn = validated_isbn(request.data)
+    if isbn is None:
+        return _response(*invalid_isbn_error())
+
+    # 重複チェック
+    existing = await Book.objects.filter(isbn=isbn).afirst()
+    if existing:
+        return _response(*duplicate_error(existing))
+
+    # 外部APIから書籍情報を取得
+    # （プレビューで検索済みの場合は保存した結果を使い、外部APIを呼ばない）
+    try:
+        book_info = await ashared_lookup(isbn, alookup_book_by_isbn)
+    except requests.exceptions.RequestException as exc:
+        return _response(*lookup_error(exc))
+
+    if book_info is None:
+        return _response(*not_found_error())
+
+    # DB保存
+    try:
+        book = await Book.objects.acreate(**new_book_fields(isbn, book_info))
+    except Exception as exc:
+        return _response(*create_error(exc))
+
+    return _response(BookSerializer(book).data, status.HTTP_201_CREATED)
+
+
+async def _book_list(request):
+    """書籍一覧: 並び順パラメータ対応（登録日時順 / タイトル50音順）と登録日時での絞り込み"""
+    ordering = request.GET.get('ordering', '-created_at')
+    if ordering not in BOOK_LIST_ORDERINGS:
+        ordering = '-created_at'
+
+    try:
+        filters = created_at_filters(request.GET)
+    except ValueError:
+        return _response(
+            {'error': 'ただしくないリクエストです'},
+            status.HTTP_400_BAD_REQUEST,
+        )
+
+    books = [book async for book in Book.objects.filter(**filters).order_by(ordering)]
+    return _response(BookSerializer(books, many=True).data)
+
+
+async def lookup_preview(request, isbn):
+    """登録前のプレビュー: バーコード読み取り直後に外部APIを検索して結果を返す"""
+    if request.method != 'GET':
+        return _method_not_allowed(request)
+
+    isbn = validated_isbn({'isbn': isbn})
+    if isbn is None:
+        return _response(*invalid_isbn_error())
+
+    existing = await Book.objects.filter(isbn=isbn).afirst()
+    if existing:
+        return _response(*duplicate_error(existing))
+
+    try:
+        book_info = await ashared_lookup(isbn, alookup_book_by_isbn)
+    except requests.exceptions.RequestException as exc:
+        return _response(*lookup_error(exc))
+
+    return _response(*preview_result(isbn, book_info))
+
+
+@_csrf_exempt
+async def book_delete(request, pk):
+    """書籍削除: 指定IDの書籍を削除"""
+    if request.method != 'DELETE':
+        return _method_not_allowed(request)
+
+    try:
+        book = await Book.objects.aget(pk=pk)
+    except Book.DoesNotExist:
+        return _response(
+            {'error': 'みつかりませんでした'},
+            status.HTTP_404_NOT_FOUND,
+        )
+
+    await book.adelete()
+    return HttpResponse(status=status.HTTP_204_NO_CONTENT)
+
+
+async def book_search(request):
+    """書籍検索: タイトル部分一致検索"""
+    if request.method != 'GET':
+        return _method_not_allowed(request)
+
+    query = request.GET.get('q', '').strip()
+
+    if not query:
+        return _response([])
+
+    books = [
+        book async for book in
+        Book.objects.filter(title__icontains=query).order_by('-created_at')
+    ]
+    return _response(BookSerializer(books, many=True).data)
@@ -0,0 +1,98 @@
+"""
+蔵書の世代番号（プロセス間で共有する変更カウンタ）
+
+タイトル候補インデックスと蔵書スナップショットはプロセスごとに保持するため、
+自分のプロセスのシグナルしか受け取れない。そこで書籍を変更するトランザクションの中で、
+DBの世代番号（LibraryGeneration の1行）を1つ進める（bulk_update や生SQLなど
+シグナルが送られない一括処理も含む）。世代番号は変更と一緒にコミットされるため、
+管理コマンドなど別のプロセスの変更も、コミットされた時点で世代番号の変化として見える。
+各プロセスは利用時に世代番号を確かめ、構築時から変わっていればDBから作り直す。
+確認のたびにDBを読まないよう、読んだ値は LIBRARY_GENERATION_POLL_INTERVAL 秒のあいだ使い回す
+（他のプロセスの変更が反映されるまで最大でこの秒数遅れる）。
+"""
+
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections, transaction
+
+from .models import LibraryGeneration
+
+# 世代番号の行のID
+GENERATION_ID = 1
+
+# 読んだ世代番号を使い回す秒数
+GENERATION_POLL_INTERVAL = 1.0
+
+_last_read = (None, 0.0)  # (世代番号, 読んだ時刻)
+_pending = threading.local()  # DB別名 -> (コミット後の処理, 進めた世代番号, セーブポイント)
+
+
+def _poll_interval():
+    return getattr(settings, 'LIBRARY_GENERATION_POLL_INTERVAL', GENERATION_POLL_INTERVAL)
+
+
+def _remember(generation):
+    global _last_read
+    _last_read = (generation, time.monotonic())
+
+
+def read_generation():
+    """DBから世代番号を読む（レプリカの遅れを受けないようプライマリから読む）"""
+    generation = (
+        LibraryGeneration.objects.using('default')
+        .filter(pk=GENERATION_ID).values_list('value', flat=True).first()
+    ) or 0
+    _remember(generation)
+    return generation
+
+
+def current_generation():
+    """現在の世代番号を返す（LIBRARY_GENERATION_POLL_INTERVAL 秒以内に読んだ値は使い回す）"""
+    generation, read_at = _last_read
+    if generation is None or time.monotonic() - read_at >= _poll_interval():
+        return read_generation()
+    return generation
+
+
+def bump_generation(using='default'):
+    """書籍を変更するトランザクションの中で世代番号を1つ進め、進めた後の値を返す
+
+    同じトランザクション（セーブポイント）の中では1回だけ進める
+    （一括削除でシグナルが続けて送られても1回）。トランザクションの外（自動コミット）では
+    呼ぶたびに進める。
+    """
+    connection = connections[using]
+    pending = getattr(_pending, 'generations', None)
+    if pending is None:
+        pending = _pending.generations = {}
+
+    # savepoint=False のブロック（None）は単独でロールバックされないため区別しない
+    savepoints = tuple(sid for sid in connection.savepoint_ids if sid is not None)
+    if connection.in_atomic_block and using in pending:
+        marker, generation, bumped_in = pending[using]
+        # 進めた後にロールバックされた場合は、コミット後の処理が取り除かれている
+        if bumped_in == savepoints and any(
+            entry[1] is marker for entry in connection.run_on_commit
+        ):
+            return generation
+
+    table = connection.ops.quote_name(LibraryGeneration._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {table} SET value = value + 1 WHERE id = %s RETURNING value',
+            [GENERATION_ID],
+        )
+        row = cursor.fetchone()
+    if row is None:
+        # マイグレーションで作る行がない場合
+        LibraryGeneration.objects.using(using).create(pk=GENERATION_ID, value=1)
+    generation = row[0] if row else 1
+
+    def marker():
+        _remember(generation)
+
+    pending[using] = (marker, generation, savepoints)
+    transaction.on_commit(marker, using=using)
+    return generation
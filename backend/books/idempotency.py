@@ -0,0 +1,189 @@
+import asyncio
+import functools
+import hashlib
+import json
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import JsonResponse
+from rest_framework import status
+from rest_framework.response import Response
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+
+# キーの最大長
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+# 処理中を示す目印の保持時間（秒）。外部API検索の最大時間より長くする
+IN_FLIGHT_TIMEOUT = 30
+
+# 処理中のリクエストの完了を待つときの確認間隔（秒）
+IN_FLIGHT_POLL_INTERVAL = 0.05
+
+
+def idempotency_cache_key(key):
+    return f'idempotency:{hashlib.sha256(key.encode()).hexdigest()}'
+
+
+def _fingerprint(request):
+    """同じキーで別の内容が送られていないか確認するためのリクエストの要約"""
+    body = repr(sorted(request.data.items())) if hasattr(request.data, 'items') else ''
+    return hashlib.sha256(f'{request.method} {request.path} {body}'.encode()).hexdigest()
+
+
+# _claim の結果: 処理中のリクエストの完了を待つ / すぐに取り直す
+_WAIT = object()
+_RETRY = object()
+
+
+def _claim(cache_key, fingerprint, make_response):
+    """キーの処理権を取得する
+
+    Returns:
+        None: 処理権を取得した（ビューを実行する）
+        _WAIT / _RETRY: 同じキーのリクエストが処理中 / 目印が消えたので取り直す
+        レスポンス: 保存済みのレスポンスの再送、またはキーの使い回しエラー
+    """
+    if cache.add(cache_key, {'fingerprint': fingerprint}, timeout=IN_FLIGHT_TIMEOUT):
+        return None
+    stored = cache.get(cache_key)
+    if stored is None:
+        # 直前に処理中の目印が消えた（5xxで終わった）
+        return _RETRY
+    if stored['fingerprint'] != fingerprint:
+        return make_response(
+            {'error': 'ただしくないリクエストです'},
+            status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    if 'status' in stored:
+        response = make_response(stored['data'], stored['status'])
+        response[REPLAYED_HEADER] = 'true'
+        return response
+    return _WAIT
+
+
+def _store(cache_key, fingerprint, response):
+    """レスポンスを保存する（5xxは保存せず処理中の目印を消す）"""
+    if response.status_code >= 500:
+        cache.delete(cache_key)
+        return
+    if hasattr(response, 'data'):
+        data = response.data
+    else:
+        data = json.loads(response.content)
+    cache.set(cache_key, {
+        'fingerprint': fingerprint,
+        'status': response.status_code,
+        'data': data,
+    }, timeout=getattr(settings, 'IDEMPOTENCY_KEY_TTL', 60 * 60 * 24))
+
+
+def _drf_response(data, status_code):
+    return Response(data, status=status_code)
+
+
+def _json_response(data, status_code):
+    return JsonResponse(
+        data, status=status_code, safe=False, json_dumps_params={'ensure_ascii': False},
+    )
+
+
+def _invalid_key(key, make_response):
+    if not key or len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        return make_response(
+            {'error': 'ただしくないリクエストです'},
+            status.HTTP_400_BAD_REQUEST,
+        )
+    return None
+
+
+def _in_progress(make_response):
+    return make_response(
+        {'error': 'いまとうろくしています。すこしまってね'},
+        status.HTTP_409_CONFLICT,
+    )
+
+
+def idempotent(view_func):
+    """Idempotency-Key ヘッダー付きのリクエストを一度だけ処理するデコレータ
+
+    最初のレスポンス（ステータスと本文）をキャッシュに IDEMPOTENCY_KEY_TTL 秒保存し、
+    同じキーの再送にはそのまま返す。同じキーのリクエストが処理中の場合は完了を待つ。
+    5xxのレスポンスは一時的な失敗として保存せず、再送時にもう一度処理する。
+    DRFの同期ビュー（request.data を持つ）と非同期ビュー（JsonResponseを返す）の両方に使える。
+    """
+    if asyncio.iscoroutinefunction(view_func):
+        return _async_idempotent(view_func)
+
+    @functools.wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if key is None:
+            return view_func(request, *args, **kwargs)
+        error = _invalid_key(key, _drf_response)
+        if error is not None:
+            return error
+
+        cache_key = idempotency_cache_key(key)
+        fingerprint = _fingerprint(request)
+        deadline = time.monotonic() + IN_FLIGHT_TIMEOUT
+        while True:
+            result = _claim(cache_key, fingerprint, _drf_response)
+            if result is None:
+                break
+            if result is _WAIT:
+                if time.monotonic() >= deadline:
+                    return _in_progress(_drf_response)
+                time.sleep(IN_FLIGHT_POLL_INTERVAL)
+            elif result is not _RETRY:
+                return result
+
+        try:
+            response = view_func(request, *args, **kwargs)
+        except Exception:
+            cache.delete(cache_key)
+            raise
+        _store(cache_key, fingerprint, response)
+        return response
+
+    return wrapper
+
+
+def _async_idempotent(view_func):
+    """idempotent の非同期ビュー版（完了待ちの間もイベントループを止めない）"""
+
+    @functools.wraps(view_func)
+    async def wrapper(request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if key is None:
+            return await view_func(request, *args, **kwargs)
+        error = _invalid_key(key, _json_response)
+        if error is not None:
+            return error
+
+        cache_key = idempotency_cache_key(key)
+        fingerprint = _fingerprint(request)
+        deadline = time.monotonic() + IN_FLIGHT_TIMEOUT
+        while True:
+            result = await sync_to_async(_claim)(cache_key, fingerprint, _json_response)
+            if result is None:
+                break
+            if result is _WAIT:
+                if time.monotonic() >= deadline:
+                    return _in_progress(_json_response)
+                await asyncio.sleep(IN_FLIGHT_POLL_INTERVAL)
+            elif result is not _RETRY:
+                return result
+
+        try:
+            response = await view_func(request, *args, **kwargs)
+        except Exception:
+            await sync_to_async(cache.delete)(cache_key)
+            raise
+        await sync_to_async(_store)(cache_key, fingerprint, response)
+        return response
+
+    return wrapper
@@ -0,0 +1,86 @@
+"""
+外部APIの検索結果の一時保存（登録前のプレビュー用）
+
+バーコードを読み取った直後に GET /api/lookup/<isbn>/ で外部APIを検索し、
+結果（見つからなかった場合の None を含む）をキャッシュに LOOKUP_CACHE_TTL 秒保存する。
+続く POST /api/books/ は保存した結果を使うため、外部APIを呼ばずに登録できる。
+同じISBNの検索が処理中の場合は、外部APIをもう一度呼ばずにその結果を待つ。
+外部APIのエラーは保存しない（次のリクエストで検索し直す）。
+"""
+
+import asyncio
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+# 検索中を示す目印の保持時間（秒）。外部API2回分のタイムアウトとレート制限の待ち時間より長くする
+LOOKUP_LOCK_TIMEOUT = 15
+
+# 処理中の検索の完了を待つときの確認間隔（秒）
+LOOKUP_POLL_INTERVAL = 0.05
+
+_MISSING = object()
+
+
+def lookup_cache_key(isbn):
+    return f'lookup:{isbn}'
+
+
+def _lock_key(isbn):
+    return f'lookup-lock:{isbn}'
+
+
+def _ttl():
+    return getattr(settings, 'LOOKUP_CACHE_TTL', 60 * 5)
+
+
+def shared_lookup(isbn, lookup):
+    """lookup(isbn) の結果を保存し、同じISBNの検索と共有する
+
+    保存済みの結果があればそれを返し、別のリクエストが検索中なら完了を待つ。
+    LOOKUP_LOCK_TIMEOUT 秒待っても終わらない場合は自分で検索する。
+    """
+    cache_key = lookup_cache_key(isbn)
+    deadline = time.monotonic() + LOOKUP_LOCK_TIMEOUT
+    while True:
+        book_info = cache.get(cache_key, _MISSING)
+        if book_info is not _MISSING:
+            return book_info
+        locked = cache.add(_lock_key(isbn), True, timeout=LOOKUP_LOCK_TIMEOUT)
+        if locked or time.monotonic() >= deadline:
+            break
+        time.sleep(LOOKUP_POLL_INTERVAL)
+
+    try:
+        book_info = lookup(isbn)
+        cache.set(cache_key, book_info, timeout=_ttl())
+    finally:
+        if locked:
+            cache.delete(_lock_key(isbn))
+    return book_info
+
+
+async def ashared_lookup(isbn, alookup):
+    """shared_lookup の非同期版（完了待ちの間もイベントループを止めない）"""
+    cache_key = lookup_cache_key(isbn)
+    deadline = time.monotonic() + LOOKUP_LOCK_TIMEOUT
+    while True:
+        book_info = await sync_to_async(cache.get)(cache_key, _MISSING)
+        if book_info is not _MISSING:
+            return book_info
+        locked = await sync_to_async(cache.add)(
+            _lock_key(isbn), True, timeout=LOOKUP_LOCK_TIMEOUT,
+        )
+        if locked or time.monotonic() >= deadline:
+            break
+        await asyncio.sleep(LOOKUP_POLL_INTERVAL)
+
+    try:
+        book_info = await alookup(isbn)
+        await sync_to_async(cache.set)(cache_key, book_info, timeout=_ttl())
+    finally:
+        if locked:
+            await sync_to_async(cache.delete)(_lock_key(isbn))
+    return book_info
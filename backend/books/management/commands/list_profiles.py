@@ -0,0 +1,75 @@
+import json
+import pstats
+from io import StringIO
+
+from django.core.management.base import BaseCommand, CommandError
+
+from books.profiling import output_dir
+
+
+class Command(BaseCommand):
+    help = 'プロファイリングの結果（books/profiling.py）を一覧・要約する'
+
+    def add_arguments(self, parser):
+        parser.add_argument('profile_id', nargs='?',
+                            help='要約を表示するプロファイルのID（省略時は一覧）')
+        parser.add_argument('--limit', type=int, default=20,
+                            help='一覧に表示する件数 / 要約に表示する関数・SQLの件数')
+
+    def handle(self, *args, **options):
+        directory = output_dir()
+        if options['profile_id']:
+            self._summary(directory, options['profile_id'], options['limit'])
+        else:
+            self._list(directory, options['limit'])
+
+    def _list(self, directory, limit):
+        """新しい順にプロファイルを一覧表示する"""
+        metas = sorted(directory.glob('*.json'), reverse=True)[:limit] if directory.exists() else []
+        if not metas:
+            self.stdout.write(f'プロファイルがありません ({directory})')
+            return
+
+        self.stdout.write(f'{"ID":<60} {"状態":>4} {"時間(ms)":>9} {"SQL":>5} {"外部API":>7}')
+        for path in metas:
+            meta = json.loads(path.read_text())
+            self.stdout.write(
+                f'{meta["id"]:<60} {meta["status_code"]:>4} '
+                f'{meta["duration"] * 1000:>9.1f} {len(meta["queries"]):>5} '
+                f'{len(meta["upstream_calls"]):>7}'
+            )
+
+    def _summary(self, directory, profile_id, limit):
+        """1件のプロファイルの要約（時間の内訳・重い関数・遅いSQL）を表示する"""
+        meta_path = directory / f'{profile_id}.json'
+        if not meta_path.exists():
+            raise CommandError(f'プロファイルが見つかりません: {profile_id}')
+        meta = json.loads(meta_path.read_text())
+
+        sql_time = sum(q['duration'] for q in meta['queries'])
+        upstream_time = sum(c['duration'] for c in meta['upstream_calls'])
+        self.stdout.write(f'{meta["method"]} {meta["path"]} -> {meta["status_code"]}')
+        self.stdout.write(
+            f'合計 {meta["duration"] * 1000:.1f}ms / '
+            f'SQL {len(meta["queries"])}件 {sql_time * 1000:.1f}ms / '
+            f'外部API {len(meta["upstream_calls"])}件 {upstream_time * 1000:.1f}ms'
+        )
+
+        for call in meta['upstream_calls']:
+            self.stdout.write(
+                f'  [{call["provider"]}] {call["status_code"]} '
+                f'{call["duration"] * 1000:.1f}ms {call["url"]}'
+            )
+
+        slowest = sorted(meta['queries'], key=lambda q: q['duration'], reverse=True)[:limit]
+        if slowest:
+            self.stdout.write('\n遅いSQL:')
+            for query in slowest:
+                self.stdout.write(f'  {query["duration"] * 1000:8.2f}ms [{query["alias"]}] {query["sql"]}')
+
+        out = StringIO()
+        stats = pstats.Stats(str(directory / f'{profile_id}.prof'), stream=out)
+        stats.sort_stats('cumulative').print_stats(limit)
+        self.stdout.write('\n累積時間の大きい関数:')
+        self.stdout.write(out.getvalue())
+        self.stdout.write(f'フレームグラフ: {directory / f"{profile_id}.collapsed"}')
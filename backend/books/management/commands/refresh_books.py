@@ -0,0 +1,155 @@
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from pathlib import Path
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from books.generation import bump_generation
+from books.models import Book
+from books.services import lookup_book_by_isbn
+
+
+class Command(BaseCommand):
+    help = '表紙画像のない書籍や古い書籍情報を外部APIから再取得して更新する'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50,
+                            help='1バッチで処理する件数')
+        parser.add_argument('--concurrency', type=int, default=4,
+                            help='外部APIを同時に呼び出す最大数')
+        parser.add_argument('--max-age', type=int, default=30,
+                            help='この日数より前に取得した書籍情報を再取得する')
+        parser.add_argument('--retry-after', type=int, default=1,
+                            help='表紙画像のない書籍をこの日数ごとに再試行する')
+        parser.add_argument('--limit', type=int, default=None,
+                            help='処理する最大件数')
+        parser.add_argument('--checkpoint', default='refresh_books.checkpoint',
+                            help='中断時に再開するためのチェックポイントファイル')
+        parser.add_argument('--restart', action='store_true',
+                            help='チェックポイントを無視して最初から処理する')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='取得結果を表示するだけでDBを更新しない')
+        parser.add_argument('--target-rate', type=float, default=1.0,
+                            help='目標スループット（件/秒）')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1 or options['concurrency'] < 1:
+            raise CommandError('--batch-size と --concurrency は1以上を指定してください')
+
+        checkpoint = Path(options['checkpoint'])
+        dry_run = options['dry_run']
+        last_pk = 0
+        if checkpoint.exists() and not options['restart']:
+            last_pk = int(checkpoint.read_text().strip() or 0)
+            self.stdout.write(f'チェックポイントから再開します (id > {last_pk})')
+
+        queryset = self._stale_books(options['max_age'], options['retry_after'])
+        stats = {'processed': 0, 'updated': 0, 'not_found': 0, 'failed': 0}
+        start = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            while options['limit'] is None or stats['processed'] < options['limit']:
+                size = options['batch_size']
+                if options['limit'] is not None:
+                    size = min(size, options['limit'] - stats['processed'])
+                # 主キー順のキーセットページングで対象を取得する
+                batch = list(
+                    queryset.filter(pk__gt=last_pk)
+                    .order_by('pk')
+                    .only('id', 'isbn', 'title', 'cover_image_url')[:size]
+                )
+                if not batch:
+                    break
+
+                results = executor.map(self._resolve, batch)
+                changed, contents = self._apply(batch, results, stats, dry_run)
+
+                if not dry_run:
+                    with transaction.atomic():
+                        Book.objects.bulk_update(
+                            changed, ['title', 'cover_image_url', 'refreshed_at'],
+                        )
+                        if contents:
+                            # bulk_update はシグナルを送らないため、バッチごとに世代番号を進めて
+                            # サーバーのタイトル候補とスナップショットを作り直させる
+                            bump_generation()
+                    last_pk = batch[-1].pk
+                    checkpoint.write_text(str(last_pk))
+                else:
+                    last_pk = batch[-1].pk
+
+        if not dry_run:
+            checkpoint.unlink(missing_ok=True)
+
+        self._report(stats, time.perf_counter() - start, options['target_rate'], dry_run)
+
+    def _stale_books(self, max_age, retry_after):
+        """再取得の対象: 未取得・取得から max_age 日経過・表紙なしで retry_after 日経過"""
+        now = timezone.now()
+        return Book.objects.filter(
+            Q(refreshed_at__isnull=True)
+            | Q(refreshed_at__lt=now - timedelta(days=max_age))
+            | Q(cover_image_url__isnull=True, refreshed_at__lt=now - timedelta(days=retry_after))
+        )
+
+    def _resolve(self, book):
+        """外部APIで書籍情報を取得する（ワーカースレッドで実行、DBにはアクセスしない）"""
+        try:
+            # バッチ処理ではレート制限に達しても失敗にせず、トークンが補充されるまで待つ
+            # （同時実行数がレートを超える場合は、その分だけ処理が遅くなる）
+            return lookup_book_by_isbn(book.isbn, block=True, timeout=math.inf)
+        except requests.exceptions.RequestException as exc:
+            return exc
+
+    def _apply(self, batch, results, stats, dry_run):
+        """取得結果を書籍に反映し、更新対象の一覧を返す"""
+        now = timezone.now()
+        changed = []
+        contents_changed = False
+        for book, info in zip(batch, results):
+            stats['processed'] += 1
+            if isinstance(info, Exception):
+                # 失敗した書籍は refreshed_at を更新せず、次回再試行する
+                stats['failed'] += 1
+                self.stderr.write(f'{book.isbn}: 取得に失敗しました ({info.__class__.__name__})')
+                continue
+
+            if info is None:
+                stats['not_found'] += 1
+            else:
+                title = info['title']
+                # 取得できなかった表紙画像で既存のURLを消さない
+                cover = info.get('cover_image_url') or book.cover_image_url
+                if title != book.title or cover != book.cover_image_url:
+                    stats['updated'] += 1
+                    contents_changed = True
+                    if dry_run:
+                        self.stdout.write(
+                            f'{book.isbn}: {book.title!r} -> {title!r}, '
+                            f'{book.cover_image_url!r} -> {cover!r}'
+                        )
+                    book.title = title
+                    book.cover_image_url = cover
+
+            book.refreshed_at = now
+            changed.append(book)
+        return changed, contents_changed
+
+    def _report(self, stats, elapsed, target_rate, dry_run):
+        rate = stats['processed'] / elapsed if elapsed > 0 else 0.0
+        prefix = '[dry-run] ' if dry_run else ''
+        self.stdout.write(
+            f'{prefix}処理 {stats["processed"]}件 / 更新 {stats["updated"]}件 / '
+            f'見つからない {stats["not_found"]}件 / 失敗 {stats["failed"]}件'
+        )
+        message = f'{elapsed:.2f}秒 ({rate:.2f}件/秒, 目標 {target_rate:.2f}件/秒)'
+        if stats['processed'] and rate < target_rate:
+            self.stdout.write(self.style.WARNING(f'スループットが目標を下回りました: {message}'))
+        else:
+            self.stdout.write(self.style.SUCCESS(message))
@@ -0,0 +1,139 @@
+import io
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from books.generation import bump_generation
+from books.models import Book
+
+# タイトル生成用の語彙（「形容 + 名詞 + 結び」の組み合わせ）
+TITLE_ADJECTIVES = [
+    'はらぺこ', 'ちいさな', 'おおきな', 'ふしぎな', 'まいごの', 'げんきな', 'ねぼすけ',
+    'よるの', 'もりの', 'うみの', 'そらとぶ', 'ひみつの', '魔法の', '赤い', '青い',
+    '星の', '雪の', 'ゆかいな', 'こわがりの', 'やさしい',
+]
+TITLE_NOUNS = [
+    'あおむし', 'くま', 'ねこ', 'いぬ', 'うさぎ', 'きょうりゅう', 'ロボット', 'おばけ',
+    'でんしゃ', 'ペンギン', 'かいじゅう', 'パンやさん', 'おひめさま', '王子さま', '探偵',
+    '宇宙人', 'ドラゴン', '忍者', 'ぼうけんか', 'おじいさん',
+]
+TITLE_SUFFIXES = [
+    'のぼうけん', 'とともだち', 'のいちにち', 'のたからもの', 'がやってきた', 'のおはなし',
+    'とふしぎなもり', 'のなつやすみ', 'をさがせ！', 'のひみつ', '物語', '図鑑', '',
+]
+
+# 生成するISBNの接頭辞（実在の日本の書籍 978-4 と衝突しないよう 979 を使う）
+ISBN_PREFIX = '979'
+
+
+def isbn13(body):
+    """12桁の本体にチェックディジットを付けてISBN-13を返す"""
+    total = sum(int(d) * (1 if i % 2 == 0 else 3) for i, d in enumerate(body))
+    return body + str((10 - total % 10) % 10)
+
+
+class Command(BaseCommand):
+    help = '性能検証用に大量の書籍データ（架空）を高速に投入する'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=1000000,
+                            help='投入する件数')
+        parser.add_argument('--batch-size', type=int, default=50000,
+                            help='1回の投入で送る件数')
+        parser.add_argument('--start', type=int, default=0,
+                            help='ISBNの連番の開始値（追加で投入する場合に重複を避ける）')
+        parser.add_argument('--days', type=int, default=365 * 5,
+                            help='登録日時を分散させる期間（日）')
+        parser.add_argument('--cover-ratio', type=float, default=0.7,
+                            help='表紙画像URLを持つ書籍の割合')
+        parser.add_argument('--seed', type=int, default=None,
+                            help='乱数シード（同じデータを再現する場合に指定）')
+
+    def handle(self, *args, **options):
+        count = options['count']
+        if count < 1 or options['batch_size'] < 1:
+            raise CommandError('--count と --batch-size は1以上を指定してください')
+        if options['start'] + count > 10 ** 9:
+            raise CommandError('ISBNの連番が上限（10億件）を超えます')
+
+        rows = self._generate_rows(
+            count, options['start'], options['days'], options['cover_ratio'],
+            random.Random(options['seed']),
+        )
+        start = time.perf_counter()
+        inserted = 0
+        with transaction.atomic():
+            while inserted < count:
+                batch = [next(rows) for _ in range(min(options['batch_size'], count - inserted))]
+                if connection.vendor == 'postgresql':
+                    self._copy(batch)
+                else:
+                    self._insert(batch)
+                inserted += len(batch)
+                self.stdout.write(f'{inserted}/{count}件 投入しました')
+            # 生SQLで投入するためシグナルは送られない。投入と同じトランザクションで世代番号を進めて
+            # サーバーのタイトル候補とスナップショットを作り直させる
+            bump_generation()
+
+        if connection.vendor == 'postgresql':
+            # 大量投入後は統計情報を更新して実行計画を安定させる
+            with connection.cursor() as cursor:
+                cursor.execute(f'ANALYZE {Book._meta.db_table}')
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'{inserted}件を{elapsed:.1f}秒で投入しました ({inserted / elapsed:.0f}件/秒)'
+        ))
+
+    def _generate_rows(self, count, start, days, cover_ratio, rng):
+        """(isbn, title, cover_image_url, created_at) を登録日時の古い順に生成する"""
+        now = timezone.now()
+        origin = now - timedelta(days=days)
+        step = (now - origin) / count
+        for i in range(count):
+            isbn = isbn13(f'{ISBN_PREFIX}{start + i:09d}')
+            title = (
+                rng.choice(TITLE_ADJECTIVES) + rng.choice(TITLE_NOUNS)
+                + rng.choice(TITLE_SUFFIXES)
+            )
+            if rng.random() < 0.3:
+                title += f' {rng.randint(1, 30)}'
+            cover = (
+                f'https://books.example.com/covers/{isbn}.jpg'
+                if rng.random() < cover_ratio else None
+            )
+            # 登録は追記型なので、IDの順と登録日時の順がおおむね一致するようにする
+            created_at = origin + step * i + timedelta(seconds=rng.random() * step.total_seconds())
+            yield isbn, title, cover, created_at
+
+    def _copy(self, batch):
+        """PostgreSQLのCOPYで投入する"""
+        buffer = io.StringIO()
+        for isbn, title, cover, created_at in batch:
+            cover = cover or '\\N'  # COPYのNULL表現
+            buffer.write(f'{isbn}\t{title}\t{cover}\t{created_at.isoformat()}\n')
+        buffer.seek(0)
+        with connection.cursor() as cursor:
+            cursor.cursor.copy_expert(
+                f'COPY {Book._meta.db_table} (isbn, title, cover_image_url, created_at) FROM STDIN',
+                buffer,
+            )
+
+    def _insert(self, batch):
+        """COPYが使えないDBではまとめてINSERTする
+
+        bulk_create は auto_now_add により created_at を上書きするため生SQLを使う。
+        """
+        sql = (
+            f'INSERT INTO {Book._meta.db_table} (isbn, title, cover_image_url, created_at) '
+            'VALUES (%s, %s, %s, %s)'
+        )
+        adapt = connection.ops.adapt_datetimefield_value
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, [
+                (isbn, title, cover, adapt(created_at)) for isbn, title, cover, created_at in batch
+            ])
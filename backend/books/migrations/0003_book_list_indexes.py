@@ -0,0 +1,43 @@
+# Generated by Django 4.2.30 on 2026-10-18 23:33
+
+from django.db import migrations, models
+
+
+def create_title_trigram_index(apps, schema_editor):
+    """タイトルの部分一致検索（title__icontains）用のトライグラムインデックス
+
+    Djangoの icontains は UPPER("title"::text) LIKE UPPER(...) を発行するため、
+    同じ式に対して pg_trgm のGINインデックスを作成する。PostgreSQL以外では何もしない。
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS book_title_trgm_idx '
+        'ON books_book USING gin (UPPER(title::text) gin_trgm_ops)'
+    )
+
+
+def drop_title_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS book_title_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0002_book_refreshed_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['created_at'], name='book_created_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['title'], name='book_title_idx'),
+        ),
+        migrations.RunPython(create_title_trigram_index, drop_title_trigram_index),
+    ]
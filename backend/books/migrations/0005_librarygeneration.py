@@ -0,0 +1,25 @@
+from django.db import migrations, models
+
+
+def create_generation_row(apps, schema_editor):
+    """世代番号の行を作る（books/generation.py は id=1 の行だけを使う）"""
+    LibraryGeneration = apps.get_model('books', 'LibraryGeneration')
+    LibraryGeneration.objects.using(schema_editor.connection.alias).get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0004_book_created_at_brin'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LibraryGeneration',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(create_generation_row, migrations.RunPython.noop),
+    ]
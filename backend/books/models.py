@@ -6,9 +6,33 @@ class Book(models.Model):
     title = models.CharField(max_length=255)
     cover_image_url = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # 外部APIから書籍情報を最後に再取得した日時（refresh_books コマンドで更新）
+    refreshed_at = models.DateTimeField(blank=True, null=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # 一覧の並び替え（登録日時順 / タイトル順）用
+            # （登録日時の範囲検索用のBRINインデックスは migrations/0004 でPostgreSQLにのみ作成する）
+            models.Index(fields=['created_at'], name='book_created_at_idx'),
+            models.Index(fields=['title'], name='book_title_idx'),
+            models.Index(fields=['refreshed_at'], name='book_refreshed_at_idx'),
+            # 表紙画像のない書籍の再取得対象を絞り込むための部分インデックス
+            models.Index(
+                fields=['refreshed_at'],
+                condition=models.Q(cover_image_url__isnull=True),
+                name='book_missing_cover_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.title
+
+
+class LibraryGeneration(models.Model):
+    """蔵書の世代番号（1行だけ持つ）
+
+    書籍を変更するトランザクションの中で1つ進める。プロセスごとに保持する
+    タイトル候補インデックスと蔵書スナップショットの作り直しの判定に使う（books/generation.py）。
+    """
+    value = models.BigIntegerField(default=0)
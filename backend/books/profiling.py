@@ -0,0 +1,265 @@
+"""
+リクエスト単位のプロファイリング（任意で有効化）
+
+PROFILING_ENABLED=True のとき、次のどちらかに当てはまるリクエストを cProfile で計測する。
+  - X-Profile ヘッダーの値が PROFILING_HEADER_TOKENS に含まれる
+  - PROFILING_SAMPLE_RATE の確率で抽出された
+計測したリクエストについて、PROFILING_OUTPUT_DIR に次のファイルを書き出す。
+  - <id>.prof       pstats形式（python -m pstats / snakeviz などで開ける）
+  - <id>.collapsed  フレームグラフ用の折りたたみスタック形式（flamegraph.pl / speedscope）
+  - <id>.json       リクエストの概要・実行したSQL・外部API呼び出し
+一覧と概要は list_profiles コマンドで確認できる。
+
+ASGI（非同期ビュー）では、cProfile はイベントループのスレッドを計測する。
+非同期ビューの処理は計測されるが、sync_to_async で別のスレッドに渡した処理
+（ORMのクエリの実行など）の関数呼び出しは含まれず、計測中に同じイベントループで
+進んだ他のリクエストの処理は含まれる。SQLと外部API呼び出しの記録はどちらでも取れる。
+"""
+
+import contextvars
+import cProfile
+import json
+import logging
+import pstats
+import random
+import time
+from contextlib import ExitStack
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.text import slugify
+
+from .signals import upstream_called
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_ID_HEADER = 'X-Profile-Id'
+
+# 折りたたみスタックに出力する最小の時間（秒）
+MIN_STACK_SECONDS = 1e-6
+
+# 計測中のリクエストの記録（SQL・外部API呼び出し）
+_current_recording = contextvars.ContextVar('profiling_recording', default=None)
+
+
+class _Recording:
+    def __init__(self):
+        self.queries = []
+        self.upstream_calls = []
+
+    def record_query(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'alias': context['connection'].alias,
+                'sql': sql,
+                'duration': time.perf_counter() - started,
+            })
+
+
+@receiver(upstream_called)
+def _record_upstream_call(sender, url, params, status_code, duration, **kwargs):
+    recording = _current_recording.get()
+    if recording is not None:
+        recording.upstream_calls.append({
+            'provider': sender,
+            'url': url,
+            'params': params,
+            'status_code': status_code,
+            'duration': duration,
+        })
+
+
+def output_dir():
+    return Path(getattr(settings, 'PROFILING_OUTPUT_DIR', settings.BASE_DIR / 'profiles'))
+
+
+def collapsed_stacks(stats):
+    """pstatsの呼び出しグラフを折りたたみスタック形式（"a;b;c マイクロ秒"）に変換する
+
+    cProfile は呼び出し元と呼び出し先の組ごとの時間しか持たないため、
+    各関数の時間を呼び出し元ごとの比率で按分した近似のスタックになる。
+    """
+    entries = stats.stats  # func -> (cc, nc, tt, ct, callers)
+    callees = {}
+    for func, (_, _, _, _, callers) in entries.items():
+        for caller, edge in callers.items():
+            # edge: (cc, nc, tt, ct) 呼び出し元 caller から呼ばれた分
+            callees.setdefault(caller, []).append((func, edge[3]))
+
+    def label(func):
+        filename, line, name = func
+        return f'{name} ({Path(filename).name}:{line})' if line else name
+
+    lines = {}
+
+    def walk(func, stack, total):
+        _, _, tt, ct, _ = entries[func]
+        if ct <= 0 or total < MIN_STACK_SECONDS:
+            # 1マイクロ秒未満に按分された枝は出力されないため辿らない（経路数の爆発も防ぐ）
+            return
+        stack = stack + [label(func)]
+        self_time = total * tt / ct
+        if self_time > 0:
+            key = ';'.join(stack)
+            lines[key] = lines.get(key, 0) + self_time
+        for callee, edge_ct in callees.get(func, []):
+            if label(callee) in stack:
+                continue  # 再帰は打ち切る
+            walk(callee, stack, total * edge_ct / ct)
+
+    def descendants(func):
+        """func から呼び出しを辿って到達できる関数の集合"""
+        found = set()
+        pending = [func]
+        while pending:
+            for callee, _ in callees.get(pending.pop(), []):
+                if callee not in found:
+                    found.add(callee)
+                    pending.append(callee)
+        return found
+
+    # 計測開始時にすでに実行中だった関数（このミドルウェアの __call__ など）からの呼び出しは
+    # 呼び出し元が記録されないため、記録された呼び出し元より呼び出し回数が多い関数も起点にする。
+    # 起点に割り当てるのは、記録された呼び出し元の分を除いた時間だけ（二重に数えない）。
+    # ただし自身の下から再帰的に呼ばれた分は ct に含まれていないため差し引かない
+    for func, (_, nc, _, ct, callers) in entries.items():
+        if nc > sum(edge[0] for edge in callers.values()):
+            nested = descendants(func)
+            unattributed = ct - sum(
+                edge[3] for caller, edge in callers.items() if caller not in nested
+            )
+            if unattributed > 0:
+                walk(func, [], unattributed)
+
+    return '\n'.join(
+        f'{stack} {int(seconds * 1_000_000)}'
+        for stack, seconds in sorted(lines.items())
+        if int(seconds * 1_000_000) > 0
+    ) + '\n'
+
+
+def _record_queries(stack, recording):
+    """このスレッドの全DB接続で実行されるSQLを recording に記録する（stack を閉じると解除）"""
+    for alias in connections:
+        stack.enter_context(connections[alias].execute_wrapper(recording.record_query))
+
+
+class ProfilingMiddleware:
+    """条件に合うリクエストを cProfile で計測し、結果をファイルに書き出すミドルウェア"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def _should_profile(self, request):
+        token = request.headers.get(PROFILE_HEADER)
+        if token and token in getattr(settings, 'PROFILING_HEADER_TOKENS', []):
+            return True
+        return random.random() < getattr(settings, 'PROFILING_SAMPLE_RATE', 0.0)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self._should_profile(request):
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        recording = _Recording()
+        token = _current_recording.set(recording)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                _record_queries(stack, recording)
+                try:
+                    profiler.enable()
+                except ValueError:
+                    # 別のプロファイラが動いている場合は計測しない
+                    logger.warning('Profiler is already active; skipping profile')
+                    return self.get_response(request)
+                try:
+                    response = self.get_response(request)
+                finally:
+                    profiler.disable()
+        finally:
+            _current_recording.reset(token)
+
+        self._finish(request, response, profiler, recording, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        """__call__ の非同期版（イベントループのスレッドを計測する）"""
+        if not self._should_profile(request):
+            return await self.get_response(request)
+
+        profiler = cProfile.Profile()
+        recording = _Recording()
+        token = _current_recording.set(recording)
+        started = time.perf_counter()
+        stack = ExitStack()
+        try:
+            # 非同期ビューのクエリは sync_to_async のスレッドで実行されるため、
+            # そのスレッドの接続にSQLの記録を仕掛ける（同じリクエストでは同じスレッドになる）
+            await sync_to_async(_record_queries)(stack, recording)
+            try:
+                profiler.enable()
+            except ValueError:
+                logger.warning('Profiler is already active; skipping profile')
+                return await self.get_response(request)
+            try:
+                response = await self.get_response(request)
+            finally:
+                profiler.disable()
+        finally:
+            await sync_to_async(stack.close)()
+            _current_recording.reset(token)
+
+        await sync_to_async(self._finish)(
+            request, response, profiler, recording, time.perf_counter() - started,
+        )
+        return response
+
+    def _finish(self, request, response, profiler, recording, elapsed):
+        try:
+            profile_id = self._write(request, response, profiler, recording, elapsed)
+            response[PROFILE_ID_HEADER] = profile_id
+        except OSError:
+            logger.exception('Failed to write profile')
+
+    def _write(self, request, response, profiler, recording, elapsed):
+        directory = output_dir()
+        directory.mkdir(parents=True, exist_ok=True)
+        now = timezone.now()
+        profile_id = '{}-{}-{}-{:04x}'.format(
+            now.strftime('%Y%m%dT%H%M%S'), request.method.lower(),
+            slugify(request.path) or 'root', random.getrandbits(16),
+        )
+
+        profiler.dump_stats(directory / f'{profile_id}.prof')
+        stats = pstats.Stats(profiler)
+        (directory / f'{profile_id}.collapsed').write_text(collapsed_stacks(stats))
+        (directory / f'{profile_id}.json').write_text(json.dumps({
+            'id': profile_id,
+            'created_at': now.isoformat(),
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status_code': response.status_code,
+            'duration': elapsed,
+            'queries': recording.queries,
+            'upstream_calls': recording.upstream_calls,
+        }, ensure_ascii=False, indent=2))
+        return profile_id
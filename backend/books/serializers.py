@@ -19,3 +19,20 @@ class ISBNSerializer(serializers.Serializer):
         if len(value) not in (10, 13):
             raise serializers.ValidationError('ISBNは10桁または13桁で入力してください')
         return value
+
+
+class BatchOperationSerializer(serializers.Serializer):
+    op = serializers.ChoiceField(choices=['delete', 'relookup'])
+    id = serializers.IntegerField(required=False, min_value=1)
+    isbn = serializers.CharField(required=False, max_length=13)
+
+    def validate(self, attrs):
+        if ('id' in attrs) == ('isbn' in attrs):
+            raise serializers.ValidationError('id または isbn のどちらか一方を指定してください')
+        return attrs
+
+
+class BatchSerializer(serializers.Serializer):
+    operations = serializers.ListField(
+        child=BatchOperationSerializer(), min_length=1, max_length=100,
+    )
@@ -1,12 +1,24 @@
+import asyncio
 import logging
+import time
+import uuid
 import xml.etree.ElementTree as ET
 
 import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+from .signals import upstream_called
 
 logger = logging.getLogger(__name__)
 
 API_TIMEOUT = 5
 
+# レートリミッタのロック保持時間（秒）と、ロック競合時の再試行間隔（秒）
+RATE_LIMIT_LOCK_TIMEOUT = 2
+RATE_LIMIT_LOCK_RETRY = 0.005
+
 # NDLサーチ OpenSearch APIの名前空間（RSS 2.0形式）
 NS = {
     'dc': 'http://purl.org/dc/elements/1.1/',
@@ -14,16 +26,179 @@ NS = {
 }
 
 
-def fetch_book_from_ndl(isbn):
-    """NDLサーチ OpenSearch APIからISBNで書籍情報を取得する"""
-    url = 'https://ndlsearch.ndl.go.jp/api/opensearch'
-    params = {'isbn': isbn}
+class RateLimitExceeded(requests.exceptions.RequestException):
+    """外部APIの呼び出し回数の上限に達した"""
+
+
+class TokenBucket:
+    """外部APIごとのトークンバケット
+
+    状態はDjangoのキャッシュに保存するため、キャッシュバックエンドを
+    共有すれば（Redis / Memcached / DatabaseCache）複数プロセス間で上限を共有できる。
+    状態の読み書きは cache.add による短時間のロックで排他制御する。
+    """
+
+    def __init__(self, name, rate, capacity):
+        self.name = name
+        self.rate = rate            # 1秒あたりに補充されるトークン数
+        self.capacity = capacity    # バケットの最大トークン数（バースト上限）
+        self._state_key = f'ratelimit:{name}:state'
+        self._lock_key = f'ratelimit:{name}:lock'
+
+    def _try_take(self):
+        """トークンを1つ取り出す
+
+        Returns:
+            float or None: 取り出せた場合0、足りない場合は次のトークンまでの秒数、
+                ロックが取れなかった場合None
+        """
+        # ロックには固有の値を入れ、解放時に自分のロックかどうかを確かめる
+        token = uuid.uuid4().hex
+        if not cache.add(self._lock_key, token, timeout=RATE_LIMIT_LOCK_TIMEOUT):
+            return None
+        try:
+            now = time.time()
+            tokens, updated_at = cache.get(self._state_key) or (self.capacity, now)
+            tokens = min(self.capacity, tokens + max(0.0, now - updated_at) * self.rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / self.rate
+            # 満タンに戻るまでの時間が経てば状態は不要になる
+            cache.set(self._state_key, (tokens, now), timeout=int(self.capacity / self.rate) + 1)
+            return wait
+        finally:
+            # ロックの有効期限が切れて別のプロセスが取り直した場合は消さない
+            if cache.get(self._lock_key) == token:
+                cache.delete(self._lock_key)
+
+    def _poll(self, deadline, block):
+        """トークンの取得を1回試みる
+
+        Returns:
+            float or None: 取得できた場合None、それ以外は次に試すまでの待ち時間（秒）
+
+        Raises:
+            RateLimitExceeded: 期限内にトークンを取得できない場合
+        """
+        wait = self._try_take()
+        if wait == 0:
+            return None
+        limit = deadline
+        if wait is None:
+            # ロック競合時は短い間隔で再試行する
+            # （即時モードでは1回だけ。待機モードではロックの保持時間まで）
+            wait = RATE_LIMIT_LOCK_RETRY
+            limit = deadline + (RATE_LIMIT_LOCK_TIMEOUT if block else RATE_LIMIT_LOCK_RETRY)
+        if time.monotonic() + wait > limit:
+            _increment_counter(self.name, 'throttled')
+            logger.warning('Rate limit exceeded for upstream API: %s', self.name)
+            raise RateLimitExceeded(f'Rate limit exceeded: {self.name}')
+        return wait
+
+    def acquire(self, block=True, timeout=None):
+        """トークンを取得する
+
+        Args:
+            block: Trueの場合、トークンが補充されるまで最大timeout秒待つ。
+                Falseの場合、足りなければ即座に RateLimitExceeded を送出する。
+            timeout: 待機の上限（秒）
+
+        Raises:
+            RateLimitExceeded: 期限内にトークンを取得できなかった場合
+        """
+        deadline = time.monotonic() + ((timeout or 0) if block else 0)
+        waited = False
+        while True:
+            wait = self._poll(deadline, block)
+            if wait is None:
+                break
+            waited = True
+            time.sleep(wait)
+        _increment_counter(self.name, 'waited' if waited else 'allowed')
+
+    async def aacquire(self, block=True, timeout=None):
+        """acquire の非同期版（待機中もイベントループを止めない）"""
+        deadline = time.monotonic() + ((timeout or 0) if block else 0)
+        waited = False
+        while True:
+            wait = await sync_to_async(self._poll)(deadline, block)
+            if wait is None:
+                break
+            waited = True
+            await asyncio.sleep(wait)
+        await sync_to_async(_increment_counter)(self.name, 'waited' if waited else 'allowed')
+
+
+def _increment_counter(name, kind):
+    key = f'ratelimit:{name}:count:{kind}'
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # addとincrの間にキャッシュから消えた場合
+        cache.set(key, 1, timeout=None)
 
-    response = requests.get(url, params=params, timeout=API_TIMEOUT)
-    response.raise_for_status()
 
+def get_rate_limit_stats():
+    """外部APIごとの呼び出しカウンタを返す
+
+    Returns:
+        dict: {provider: {'allowed': int, 'waited': int, 'throttled': int}}
+    """
+    stats = {}
+    for name in getattr(settings, 'UPSTREAM_RATE_LIMITS', {}):
+        kinds = ('allowed', 'waited', 'throttled')
+        values = cache.get_many([f'ratelimit:{name}:count:{kind}' for kind in kinds])
+        stats[name] = {
+            kind: values.get(f'ratelimit:{name}:count:{kind}', 0) for kind in kinds
+        }
+    return stats
+
+
+def _bucket_for(provider, block, timeout):
+    """providerのトークンバケットと待機設定を返す（制限しない場合はNone）"""
+    config = getattr(settings, 'UPSTREAM_RATE_LIMITS', {}).get(provider)
+    if not config:
+        return None
+    if block is None:
+        block = getattr(settings, 'UPSTREAM_RATE_LIMIT_BLOCK', True)
+    if timeout is None:
+        timeout = getattr(settings, 'UPSTREAM_RATE_LIMIT_TIMEOUT', 0)
+    return TokenBucket(provider, config['rate'], config['capacity']), block, timeout
+
+
+def throttle(provider, block=None, timeout=None):
+    """外部API呼び出し前にレート制限のトークンを取得する
+
+    設定 UPSTREAM_RATE_LIMITS に定義のないproviderは制限しない。
+    block / timeout を省略した場合は UPSTREAM_RATE_LIMIT_BLOCK /
+    UPSTREAM_RATE_LIMIT_TIMEOUT の設定値を使う。
+    timeout に math.inf を渡すと、トークンが補充されるまで上限なく待つ。
+    """
+    limit = _bucket_for(provider, block, timeout)
+    if limit is not None:
+        bucket, block, timeout = limit
+        bucket.acquire(block=block, timeout=timeout)
+
+
+async def athrottle(provider, block=None, timeout=None):
+    """throttle の非同期版"""
+    limit = _bucket_for(provider, block, timeout)
+    if limit is not None:
+        bucket, block, timeout = limit
+        await bucket.aacquire(block=block, timeout=timeout)
+
+
+NDL_API_URL = 'https://ndlsearch.ndl.go.jp/api/opensearch'
+GOOGLE_BOOKS_API_URL = 'https://www.googleapis.com/books/v1/volumes'
+
+
+def _parse_ndl_response(content, isbn):
+    """NDLサーチ OpenSearch APIのレスポンス（XML）から書籍情報を取り出す"""
     try:
-        root = ET.fromstring(response.content)
+        root = ET.fromstring(content)
     except ET.ParseError:
         logger.warning('NDL API returned invalid XML for ISBN: %s', isbn)
         return None
@@ -46,15 +221,8 @@ def fetch_book_from_ndl(isbn):
     }
 
 
-def fetch_cover_from_google_books(isbn):
-    """Google Books APIからISBNで表紙画像URLを取得する"""
-    url = 'https://www.googleapis.com/books/v1/volumes'
-    params = {'q': f'isbn:{isbn}'}
-
-    response = requests.get(url, params=params, timeout=API_TIMEOUT)
-    response.raise_for_status()
-
-    data = response.json()
+def _parse_google_books_response(data):
+    """Google Books APIのレスポンス（JSON）から表紙画像URLを取り出す"""
     if data.get('totalItems', 0) == 0:
         return None
 
@@ -75,14 +243,61 @@ def fetch_cover_from_google_books(isbn):
     return cover_url
 
 
-def lookup_book_by_isbn(isbn):
+def _notify_upstream_call(provider, url, params, status_code, started):
+    """外部API呼び出しを upstream_called シグナルで通知する（プロファイリング用）"""
+    upstream_called.send(
+        sender=provider, url=url, params=params, status_code=status_code,
+        duration=time.perf_counter() - started,
+    )
+
+
+def _get(provider, url, params):
+    """外部APIにGETし、HTTPエラーの場合は例外を送出する"""
+    started = time.perf_counter()
+    status_code = None
+    try:
+        response = requests.get(url, params=params, timeout=API_TIMEOUT)
+        status_code = response.status_code
+        response.raise_for_status()
+        return response
+    finally:
+        _notify_upstream_call(provider, url, params, status_code, started)
+
+
+def fetch_book_from_ndl(isbn, block=None, timeout=None):
+    """NDLサーチ OpenSearch APIからISBNで書籍情報を取得する
+
+    block / timeout はレート制限の待機設定（throttle を参照）
+    """
+    params = {'isbn': isbn}
+
+    throttle('ndl', block=block, timeout=timeout)
+    response = _get('ndl', NDL_API_URL, params)
+
+    return _parse_ndl_response(response.content, isbn)
+
+
+def fetch_cover_from_google_books(isbn, block=None, timeout=None):
+    """Google Books APIからISBNで表紙画像URLを取得する"""
+    params = {'q': f'isbn:{isbn}'}
+
+    throttle('google_books', block=block, timeout=timeout)
+    response = _get('google_books', GOOGLE_BOOKS_API_URL, params)
+
+    return _parse_google_books_response(response.json())
+
+
+def lookup_book_by_isbn(isbn, block=None, timeout=None):
     """ISBNから書籍情報を検索する（NDL→Google Booksのフォールバック）
 
+    Args:
+        block / timeout: レート制限の待機設定（省略時は設定値。throttle を参照）
+
     Returns:
         dict: {'title': str, 'cover_image_url': str|None} or None
     """
     # 1. NDLサーチAPIで書籍情報を取得
-    book_info = fetch_book_from_ndl(isbn)
+    book_info = fetch_book_from_ndl(isbn, block=block, timeout=timeout)
 
     if book_info is None:
         return None
@@ -90,9 +305,79 @@ def lookup_book_by_isbn(isbn):
     # 2. 表紙画像がない場合、Google Books APIでフォールバック
     if not book_info['cover_image_url']:
         try:
-            cover_url = fetch_cover_from_google_books(isbn)
+            cover_url = fetch_cover_from_google_books(isbn, block=block, timeout=timeout)
             book_info['cover_image_url'] = cover_url
         except requests.exceptions.RequestException:
             logger.warning('Google Books API failed for ISBN: %s', isbn)
 
     return book_info
+
+
+# --- 非同期版（ASGI用） ---
+
+
+def async_http_client():
+    """外部API呼び出し用の非同期HTTPクライアントを作成する"""
+    # httpx は非同期ビューでしか使わないため、同期（WSGI）ワーカーの起動時には読み込まない
+    import httpx
+
+    return httpx.AsyncClient(timeout=API_TIMEOUT)
+
+
+async def _aget(provider, client, url, params):
+    """非同期でGETし、httpxの例外を同期版と同じ requests の例外に変換する"""
+    import httpx
+
+    started = time.perf_counter()
+    status_code = None
+    try:
+        response = await client.get(url, params=params)
+        status_code = response.status_code
+        response.raise_for_status()
+    except httpx.TimeoutException as exc:
+        raise requests.exceptions.Timeout(str(exc)) from exc
+    except httpx.HTTPStatusError as exc:
+        raise requests.exceptions.HTTPError(str(exc)) from exc
+    except httpx.TransportError as exc:
+        raise requests.exceptions.ConnectionError(str(exc)) from exc
+    except httpx.HTTPError as exc:
+        raise requests.exceptions.RequestException(str(exc)) from exc
+    finally:
+        _notify_upstream_call(provider, url, params, status_code, started)
+    return response
+
+
+async def afetch_book_from_ndl(isbn, client):
+    """fetch_book_from_ndl の非同期版"""
+    await athrottle('ndl')
+    response = await _aget('ndl', client, NDL_API_URL, {'isbn': isbn})
+    return _parse_ndl_response(response.content, isbn)
+
+
+async def afetch_cover_from_google_books(isbn, client):
+    """fetch_cover_from_google_books の非同期版"""
+    await athrottle('google_books')
+    response = await _aget('google_books', client, GOOGLE_BOOKS_API_URL, {'q': f'isbn:{isbn}'})
+    return _parse_google_books_response(response.json())
+
+
+async def alookup_book_by_isbn(isbn):
+    """lookup_book_by_isbn の非同期版（外部APIの待ち時間中もスレッドを占有しない）
+
+    Returns:
+        dict: {'title': str, 'cover_image_url': str|None} or None
+    """
+    async with async_http_client() as client:
+        book_info = await afetch_book_from_ndl(isbn, client)
+
+        if book_info is None:
+            return None
+
+        if not book_info['cover_image_url']:
+            try:
+                cover_url = await afetch_cover_from_google_books(isbn, client)
+                book_info['cover_image_url'] = cover_url
+            except requests.exceptions.RequestException:
+                logger.warning('Google Books API failed for ISBN: %s', isbn)
+
+    return book_info
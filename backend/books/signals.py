@@ -0,0 +1,42 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from .generation import bump_generation
+from .models import Book
+from .snapshot import library_snapshot
+from .suggest import title_index
+
+# 外部API（NDL / Google Books）を呼び出したときに送られる
+# 引数: sender=プロバイダ名, url, params, status_code（通信エラー時None）, duration（秒）
+upstream_called = Signal()
+
+
+def apply_book_changes(generation, saved=(), deleted=()):
+    """コミット済みの書籍の変更を自分のプロセスのタイトル候補と蔵書スナップショットに反映する
+
+    他のプロセスのインデックスとスナップショットは、世代番号の変化で次回利用時に作り直される。
+
+    Args:
+        generation: 変更したトランザクションで進めた世代番号（bump_generation の戻り値）
+        saved: 登録・更新された書籍の (id, タイトル, ISBN, 表紙画像URL) のリスト
+        deleted: 削除された書籍のidのリスト
+    """
+    title_index.apply([(pk, title) for pk, title, *_ in saved], deleted, generation)
+    library_snapshot.apply(saved, deleted, generation)
+
+
+@receiver(post_save, sender=Book)
+def reflect_saved_book(sender, instance, using, **kwargs):
+    """登録・更新された書籍をタイトル候補とスナップショットに反映する（コミット後）"""
+    saved = [(instance.pk, instance.title, instance.isbn, instance.cover_image_url)]
+    generation = bump_generation(using)
+    transaction.on_commit(lambda: apply_book_changes(generation, saved=saved), using=using)
+
+
+@receiver(post_delete, sender=Book)
+def reflect_deleted_book(sender, instance, using, **kwargs):
+    """削除された書籍をタイトル候補とスナップショットから取り除く（コミット後）"""
+    deleted = [instance.pk]
+    generation = bump_generation(using)
+    transaction.on_commit(lambda: apply_book_changes(generation, deleted=deleted), using=using)
@@ -0,0 +1,177 @@
+"""
+クライアント側検索用の蔵書スナップショット
+
+蔵書の id・タイトル・照合用キー・ISBN・表紙画像URL をまとめたJSON
+  {"version": "...", "books": [[id, "タイトル", "照合用キー", "ISBN", "表紙画像URL" or null], ...]}
+とそのgzip圧縮をあらかじめ作っておき、GET /api/books/snapshot/ でそのまま返す。
+初回利用時にDBから構築し、以降は Book のシグナルで1件分ずつ差分更新する。
+変更があった場合は次のリクエストで1回だけ圧縮し直すため、リクエストごとのシリアライズはない。
+version は内容のハッシュで、ETag に使う。スナップショットはプロセスごとに保持され、
+他のプロセスや一括処理による変更は世代番号（generation.py）の変化で検知して作り直す。
+そのため各プロセスは同じ内容（同じ version）に揃う。
+"""
+
+import gzip
+import hashlib
+import json
+import threading
+import unicodedata
+from collections import namedtuple
+
+from .generation import current_generation, read_generation
+from .models import Book
+
+# スナップショットに載せる最大件数（超えた場合は提供せず、サーバー側の検索を使ってもらう）
+SNAPSHOT_MAX_ENTRIES = 20000
+
+# 生成済みのスナップショット（version, JSON, gzip圧縮したJSON）
+SnapshotArtifact = namedtuple('SnapshotArtifact', ['version', 'content', 'compressed'])
+
+
+def match_key(title):
+    """クライアントでの部分一致用にタイトルを正規化する（NFKC・小文字）
+
+    クライアントは検索語を String.prototype.normalize('NFKC').toLowerCase() で正規化し、
+    このキーと比べる。normalize_title（suggest.py）の casefold は toLowerCase と
+    結果が異なる（ß → ss など）ため、ここでは同じ規則の str.lower を使う
+    （語末のシグマもどちらも ς になる）。
+    """
+    return unicodedata.normalize('NFKC', title or '').strip().lower()
+
+
+def _encode_row(pk, title, isbn, cover_image_url):
+    return json.dumps(
+        [pk, title, match_key(title), isbn, cover_image_url],
+        ensure_ascii=False, separators=(',', ':'),
+    ).encode('utf-8')
+
+
+class LibrarySnapshot:
+    """蔵書スナップショットの生成済みデータ
+
+    1件ごとにエンコード済みのJSONを保持し、追加・更新・削除ではその1件だけを作り直す。
+    件数が max_entries を超える場合は構築せず（コールド状態のまま）、artifact() は None を返す。
+    """
+
+    def __init__(self, max_entries=SNAPSHOT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._rows = {}         # id -> エンコード済みの1件分
+        self._artifact = None   # None の場合は次回の artifact() で作り直す
+        self._ready = False
+        self._attempted = False
+        self._generation = None  # 構築時（または最後の差分更新時）の世代番号
+
+    @property
+    def ready(self):
+        return self._ready
+
+    def invalidate(self):
+        """スナップショットを破棄する（次回利用時に再構築される）"""
+        with self._lock:
+            self._rows = {}
+            self._artifact = None
+            self._ready = False
+            self._attempted = False
+
+    def build(self):
+        """DBから全件を読み込んでスナップショットを構築する
+
+        Returns:
+            bool: 構築できた場合True（件数上限を超えた場合False）
+        """
+        # 読み込み中の変更を取りこぼさないよう、世代番号は書籍より先に読む。
+        # 書籍も世代番号と同じくプライマリから読む（レプリカの遅れた内容に新しい世代番号が付くと、
+        # 次の変更まで作り直されない）
+        generation = read_generation()
+        rows = list(
+            Book.objects.using('default').order_by().values_list(
+                'id', 'title', 'isbn', 'cover_image_url',
+            )[:self.max_entries + 1]
+        )
+        with self._lock:
+            self._attempted = True
+            self._generation = generation
+            self._artifact = None
+            if len(rows) > self.max_entries:
+                self._rows = {}
+                self._ready = False
+                return False
+
+            self._rows = {row[0]: _encode_row(*row) for row in rows}
+            self._ready = True
+            return True
+
+    def artifact(self):
+        """生成済みのスナップショットを返す
+
+        Returns:
+            SnapshotArtifact or None: コールド状態（件数上限超え）の場合None
+        """
+        if not self._attempted or (self._ready and self._generation != current_generation()):
+            self.build()
+
+        with self._lock:
+            if not self._ready:
+                return None
+            if self._artifact is None:
+                self._artifact = self._compile_locked()
+            return self._artifact
+
+    def add(self, pk, title, isbn, cover_image_url=None):
+        """書籍を追加（既存IDの場合は更新）する"""
+        with self._lock:
+            self._add_locked(pk, title, isbn, cover_image_url)
+
+    def discard(self, pk):
+        """書籍をスナップショットから取り除く"""
+        with self._lock:
+            self._discard_locked(pk)
+
+    def apply(self, saved, deleted, generation):
+        """自分のプロセスの変更を差分更新し、世代番号を generation に進める
+
+        構築後に他のプロセスの変更が入っていた（世代番号が連続しない）場合は何もせず、
+        次回利用時に作り直す（同じトランザクションの変更は同じ世代番号になる）。
+
+        Args:
+            saved: 登録・更新された書籍の (id, タイトル, ISBN, 表紙画像URL) のリスト
+            deleted: 削除された書籍のidのリスト
+            generation: この変更のトランザクションで進めた世代番号
+        """
+        with self._lock:
+            if not self._ready or self._generation not in (generation - 1, generation):
+                return
+            for pk in deleted:
+                self._discard_locked(pk)
+            for row in saved:
+                self._add_locked(*row)
+            self._generation = generation
+
+    def _add_locked(self, pk, title, isbn, cover_image_url):
+        if not self._ready:
+            return
+        if pk not in self._rows and len(self._rows) >= self.max_entries:
+            # 上限を超えたらコールド状態に戻す
+            self._rows = {}
+            self._artifact = None
+            self._ready = False
+            return
+        row = _encode_row(pk, title, isbn, cover_image_url)
+        if self._rows.get(pk) != row:
+            self._rows[pk] = row
+            self._artifact = None
+
+    def _discard_locked(self, pk):
+        if self._ready and self._rows.pop(pk, None) is not None:
+            self._artifact = None
+
+    def _compile_locked(self):
+        books = b'[' + b','.join(self._rows[pk] for pk in sorted(self._rows)) + b']'
+        version = hashlib.sha256(books).hexdigest()[:16]
+        content = b'{"version":"' + version.encode('ascii') + b'","books":' + books + b'}'
+        # mtime を固定し、同じ内容なら同じバイト列になるようにする
+        return SnapshotArtifact(version, content, gzip.compress(content, mtime=0))
+
+
+library_snapshot = LibrarySnapshot()
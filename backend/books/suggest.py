@@ -0,0 +1,177 @@
+import bisect
+import threading
+import unicodedata
+
+from .generation import current_generation, read_generation
+from .models import Book
+
+# インデックスに載せる最大件数（超えた場合はインデックスを使わずDB検索に切り替える）
+SUGGEST_MAX_ENTRIES = 100000
+
+# 候補の返却件数（デフォルト / 上限）
+SUGGEST_DEFAULT_LIMIT = 10
+SUGGEST_MAX_LIMIT = 50
+
+
+def normalize_title(title):
+    """検索用にタイトルを正規化する（全角半角の統一・大文字小文字の無視）"""
+    return unicodedata.normalize('NFKC', title or '').strip().casefold()
+
+
+class TitlePrefixIndex:
+    """正規化タイトルのソート済み配列による前方一致インデックス
+
+    初回利用時にDBから構築し、以降は Book の post_save / post_delete シグナルで
+    差分更新する。インデックスはプロセスごとに保持され、他のプロセスや一括処理による
+    変更は世代番号（generation.py）の変化で検知して作り直す。
+    件数が max_entries を超える場合は構築せず（コールド状態のまま）、
+    呼び出し側はDB検索にフォールバックする。
+    """
+
+    def __init__(self, max_entries=SUGGEST_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._keys = []      # [(正規化タイトル, id)] をソートして保持
+        self._entries = {}   # id -> (正規化タイトル, タイトル)
+        self._ready = False
+        self._attempted = False
+        self._generation = None  # 構築時（または最後の差分更新時）の世代番号
+
+    @property
+    def ready(self):
+        return self._ready
+
+    def invalidate(self):
+        """インデックスを破棄する（次回利用時に再構築される）"""
+        with self._lock:
+            self._keys = []
+            self._entries = {}
+            self._ready = False
+            self._attempted = False
+
+    def build(self):
+        """DBから全件を読み込んでインデックスを構築する
+
+        Returns:
+            bool: 構築できた場合True（件数上限を超えた場合False）
+        """
+        # 読み込み中の変更を取りこぼさないよう、世代番号は書籍より先に読む。
+        # 書籍も世代番号と同じくプライマリから読む（レプリカの遅れた内容に新しい世代番号が付くと、
+        # 次の変更まで作り直されない）
+        generation = read_generation()
+        rows = list(
+            Book.objects.using('default').order_by()
+            .values_list('id', 'title')[:self.max_entries + 1]
+        )
+        with self._lock:
+            self._attempted = True
+            self._generation = generation
+            if len(rows) > self.max_entries:
+                self._keys = []
+                self._entries = {}
+                self._ready = False
+                return False
+
+            entries = {pk: (normalize_title(title), title) for pk, title in rows}
+            self._entries = entries
+            self._keys = sorted((key, pk) for pk, (key, _) in entries.items())
+            self._ready = True
+            return True
+
+    def suggest(self, query, limit=SUGGEST_DEFAULT_LIMIT):
+        """前方一致するタイトルを正規化タイトル順に最大limit件返す
+
+        Returns:
+            list[str] or None: インデックスがコールドの場合None
+        """
+        if not self._attempted or (self._ready and self._generation != current_generation()):
+            self.build()
+
+        prefix = normalize_title(query)
+        with self._lock:
+            if not self._ready:
+                return None
+
+            titles = []
+            seen = set()
+            i = bisect.bisect_left(self._keys, (prefix,))
+            while i < len(self._keys) and len(titles) < limit:
+                key, pk = self._keys[i]
+                if not key.startswith(prefix):
+                    break
+                title = self._entries[pk][1]
+                if title not in seen:
+                    seen.add(title)
+                    titles.append(title)
+                i += 1
+            return titles
+
+    def add(self, pk, title):
+        """書籍を追加（既存IDの場合はタイトルを更新）する"""
+        with self._lock:
+            self._add_locked(pk, title)
+
+    def discard(self, pk):
+        """書籍をインデックスから取り除く"""
+        with self._lock:
+            if self._ready:
+                self._remove_locked(pk)
+
+    def apply(self, saved, deleted, generation):
+        """自分のプロセスの変更を差分更新し、世代番号を generation に進める
+
+        構築後に他のプロセスの変更が入っていた（世代番号が連続しない）場合は何もせず、
+        次回利用時に作り直す（同じトランザクションの変更は同じ世代番号になる）。
+
+        Args:
+            saved: 登録・更新された書籍の (id, タイトル) のリスト
+            deleted: 削除された書籍のidのリスト
+            generation: この変更のトランザクションで進めた世代番号
+        """
+        with self._lock:
+            if not self._ready or self._generation not in (generation - 1, generation):
+                return
+            for pk in deleted:
+                self._remove_locked(pk)
+            for pk, title in saved:
+                self._add_locked(pk, title)
+            self._generation = generation
+
+    def _add_locked(self, pk, title):
+        if not self._ready:
+            return
+        self._remove_locked(pk)
+        if len(self._entries) >= self.max_entries:
+            # 上限を超えたらコールド状態に戻し、DB検索に切り替える
+            self._keys = []
+            self._entries = {}
+            self._ready = False
+            return
+        key = normalize_title(title)
+        self._entries[pk] = (key, title)
+        bisect.insort(self._keys, (key, pk))
+
+    def _remove_locked(self, pk):
+        entry = self._entries.pop(pk, None)
+        if entry is None:
+            return
+        i = bisect.bisect_left(self._keys, (entry[0], pk))
+        if i < len(self._keys) and self._keys[i] == (entry[0], pk):
+            del self._keys[i]
+
+
+title_index = TitlePrefixIndex()
+
+
+def suggest_titles(query, limit=SUGGEST_DEFAULT_LIMIT):
+    """タイトル候補を返す（インデックスがコールドの場合はDBで前方一致検索）"""
+    titles = title_index.suggest(query, limit)
+    if titles is not None:
+        return titles
+
+    return list(
+        Book.objects.filter(title__istartswith=query.strip())
+        .order_by('title')
+        .values_list('title', flat=True)
+        .distinct()[:limit]
+    )
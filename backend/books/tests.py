@@ -1,15 +1,50 @@
-from unittest.mock import MagicMock, patch
-
+import gzip
+import json
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import httpx
 import requests
-from django.test import TestCase
+from asgiref.sync import async_to_sync, sync_to_async
+from config import db_router, settings_api
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.http import HttpResponse
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, override_settings
+from django.utils import timezone
 from rest_framework.test import APIClient
 
-from .models import Book
+from . import async_views
+from .generation import bump_generation, read_generation
+from .idempotency import idempotency_cache_key
+from .lookup_cache import shared_lookup
+from .management.commands.seed_books import isbn13
+from .models import Book, LibraryGeneration
+from .profiling import ProfilingMiddleware, collapsed_stacks
 from .services import (
+    RateLimitExceeded,
+    TokenBucket,
+    alookup_book_by_isbn,
     fetch_book_from_ndl,
     fetch_cover_from_google_books,
+    get_rate_limit_stats,
     lookup_book_by_isbn,
+    throttle,
 )
+from .snapshot import LibrarySnapshot, library_snapshot, match_key
+from .suggest import TitlePrefixIndex, normalize_title, title_index
 
 
 class BookCreateAPITest(TestCase):
@@ -18,6 +53,7 @@ class BookCreateAPITest(TestCase):
     def setUp(self):
         self.client = APIClient()
         self.url = '/api/books/'
+        cache.clear()
 
     @patch('books.views.lookup_book_by_isbn')
     def test_create_success(self, mock_lookup):
@@ -85,6 +121,12 @@ class BookCreateAPITest(TestCase):
         response = self.client.post(self.url, {'isbn': '9784000000001'})
         self.assertEqual(response.status_code, 502)
 
+    @patch('books.views.lookup_book_by_isbn')
+    def test_create_rate_limited(self, mock_lookup):
+        mock_lookup.side_effect = RateLimitExceeded()
+        response = self.client.post(self.url, {'isbn': '9784000000001'})
+        self.assertEqual(response.status_code, 503)
+
 
 class BookListAPITest(TestCase):
     """GET /api/books/ — 書籍一覧のテスト"""
@@ -126,6 +168,72 @@ class BookListAPITest(TestCase):
         self.assertEqual(len(response.data), 0)
 
 
+class BookListDateFilterAPITest(TestCase):
+    """GET /api/books/?since=&until=&month= — 登録日時での絞り込みのテスト"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.url = '/api/books/'
+        # 登録日時は Asia/Tokyo（settings.TIME_ZONE）で指定する
+        for isbn, created_at in [
+            ('9784000000001', '2026-08-31T23:59:59+09:00'),
+            ('9784000000002', '2026-09-01T00:00:00+09:00'),
+            ('9784000000003', '2026-09-15T12:00:00+09:00'),
+            ('9784000000004', '2026-09-30T23:59:59+09:00'),
+            ('9784000000005', '2026-10-01T00:00:00+09:00'),
+        ]:
+            book = Book.objects.create(isbn=isbn, title=f'本{isbn[-1]}')
+            Book.objects.filter(pk=book.pk).update(created_at=created_at)
+
+    def _isbns(self, params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return [b['isbn'][-1] for b in response.data]
+
+    def test_month(self):
+        self.assertEqual(self._isbns({'month': '2026-09'}), ['4', '3', '2'])
+
+    def test_month_december(self):
+        Book.objects.create(isbn='9784000000006', title='本6')
+        Book.objects.filter(isbn='9784000000006').update(created_at='2026-12-31T23:00:00+09:00')
+        self.assertEqual(self._isbns({'month': '2026-12'}), ['6'])
+
+    def test_since_and_until_dates(self):
+        # until の日付はその日の終わりまで含む
+        self.assertEqual(
+            self._isbns({'since': '2026-09-15', 'until': '2026-09-30', 'ordering': 'created_at'}),
+            ['3', '4'],
+        )
+
+    def test_since_and_until_datetimes(self):
+        self.assertEqual(
+            self._isbns({'since': '2026-09-01T00:00:00+09:00', 'until': '2026-09-15T12:00:00+09:00'}),
+            ['3', '2'],
+        )
+
+    def test_month_combined_with_since(self):
+        self.assertEqual(self._isbns({'month': '2026-09', 'since': '2026-09-10'}), ['4', '3'])
+
+    def test_invalid_values(self):
+        for params in [
+            {'since': 'yesterday'},
+            {'until': '2026-02-30'},
+            {'month': '2026-13'},
+            {'month': '2026'},
+            {'month': '26-09'},
+        ]:
+            with self.subTest(params=params):
+                response = self.client.get(self.url, params)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.data, {'error': 'ただしくないリクエストです'})
+
+    def test_async_view(self):
+        request = AsyncRequestFactory().get(self.url, {'month': '2026-09'})
+        response = async_to_sync(async_views.book_list_create)(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([b['isbn'][-1] for b in json.loads(response.content)], ['4', '3', '2'])
+
+
 class BookDeleteAPITest(TestCase):
     """DELETE /api/books/{id}/ — 書籍削除のテスト"""
 
@@ -185,8 +293,496 @@ class BookSearchAPITest(TestCase):
         self.assertEqual(len(response.data), 0)
 
 
+class BookSuggestAPITest(TestCase):
+    """GET /api/books/suggest/?q= — タイトル候補のテスト"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.url = '/api/books/suggest/'
+        title_index.invalidate()
+        Book.objects.create(isbn='9784000000001', title='ドラえもん')
+        Book.objects.create(isbn='9784000000002', title='ドラゴンボール')
+        Book.objects.create(isbn='9784000000003', title='ワンピース')
+
+    def tearDown(self):
+        title_index.invalidate()
+
+    def test_suggest_prefix_match(self):
+        response = self.client.get(self.url, {'q': 'ドラ'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, ['ドラえもん', 'ドラゴンボール'])
+
+    def test_suggest_no_partial_match(self):
+        # 前方一致のみ（部分一致はしない）
+        response = self.client.get(self.url, {'q': 'ピース'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, [])
+
+    def test_suggest_limit(self):
+        response = self.client.get(self.url, {'q': 'ドラ', 'limit': '1'})
+        self.assertEqual(response.data, ['ドラえもん'])
+
+    def test_suggest_empty_query(self):
+        response = self.client.get(self.url, {'q': '  '})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, [])
+
+    def test_suggest_does_not_query_db_when_warm(self):
+        self.client.get(self.url, {'q': 'ワ'})
+        self.assertTrue(title_index.ready)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, {'q': 'ワン'})
+        self.assertEqual(response.data, ['ワンピース'])
+
+    def test_suggest_reflects_create_and_delete(self):
+        self.client.get(self.url, {'q': 'ド'})
+        with self.captureOnCommitCallbacks(execute=True):
+            book = Book.objects.create(isbn='9784000000004', title='ドリトル先生')
+        response = self.client.get(self.url, {'q': 'ドリ'})
+        self.assertEqual(response.data, ['ドリトル先生'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            book.delete()
+        response = self.client.get(self.url, {'q': 'ドリ'})
+        self.assertEqual(response.data, [])
+
+    @override_settings(LIBRARY_GENERATION_POLL_INTERVAL=0)
+    def test_suggest_rebuilds_after_change_in_other_process(self):
+        self.client.get(self.url, {'q': 'ワ'})
+        # 他のプロセス（一括処理など）がシグナルなしで更新し、世代番号を進めた
+        Book.objects.filter(title='ワンピース').update(title='ワンダーランド')
+        _bump_in_other_process()
+        response = self.client.get(self.url, {'q': 'ワン'})
+        self.assertEqual(response.data, ['ワンダーランド'])
+
+    @patch('books.suggest.title_index', TitlePrefixIndex(max_entries=2))
+    def test_suggest_falls_back_to_db_when_cold(self):
+        response = self.client.get(self.url, {'q': 'ドラ'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, ['ドラえもん', 'ドラゴンボール'])
+
+
+class TitlePrefixIndexTest(TestCase):
+    """タイトル前方一致インデックスのテスト"""
+
+    def test_normalize_title(self):
+        self.assertEqual(normalize_title(' ＡＢＣ ｶﾀｶﾅ '), 'abc カタカナ')
+
+    def test_suggest_normalized_prefix(self):
+        Book.objects.create(isbn='9784000000001', title='Harry Potter')
+        index = TitlePrefixIndex()
+        self.assertEqual(index.suggest('ｈａｒ'), ['Harry Potter'])
+
+    def test_suggest_deduplicates_titles(self):
+        Book.objects.create(isbn='9784000000001', title='ぐりとぐら')
+        Book.objects.create(isbn='9784000000002', title='ぐりとぐら')
+        index = TitlePrefixIndex()
+        self.assertEqual(index.suggest('ぐり'), ['ぐりとぐら'])
+
+    def test_add_updates_existing_title(self):
+        index = TitlePrefixIndex()
+        index.build()
+        index.add(1, 'あいうえお')
+        index.add(1, 'かきくけこ')
+        self.assertEqual(index.suggest('あ'), [])
+        self.assertEqual(index.suggest('か'), ['かきくけこ'])
+
+    @override_settings(LIBRARY_GENERATION_POLL_INTERVAL=0)
+    def test_apply_rebuilds_when_other_change_intervened(self):
+        Book.objects.create(isbn='9784000000001', title='あいうえお')
+        index = TitlePrefixIndex()
+        index.build()
+        # 構築後に他のプロセスが変更していたため、差分更新せずに作り直す
+        Book.objects.bulk_create([Book(isbn='9784000000002', title='あかさたな')])
+        generation = _bump_in_other_process()
+        index.apply([(999, 'あいこ')], [], generation + 1)
+        self.assertEqual(index.suggest('あ'), ['あいうえお', 'あかさたな'])
+
+    def test_one_bump_per_transaction(self):
+        generation = read_generation()
+        with transaction.atomic():
+            Book.objects.create(isbn='9784000000001', title='あいうえお')
+            Book.objects.create(isbn='9784000000002', title='かきくけこ')
+            Book.objects.all().delete()
+        self.assertEqual(read_generation(), generation + 1)
+
+    def test_rolled_back_bump_is_redone(self):
+        generation = read_generation()
+        with transaction.atomic():
+            try:
+                with transaction.atomic():
+                    Book.objects.create(isbn='9784000000001', title='あいうえお')
+                    raise IntegrityError
+            except IntegrityError:
+                pass
+            self.assertEqual(bump_generation(), generation + 1)
+
+    def test_add_over_capacity_goes_cold(self):
+        index = TitlePrefixIndex(max_entries=1)
+        index.build()
+        index.add(1, 'あいうえお')
+        index.add(2, 'かきくけこ')
+        self.assertFalse(index.ready)
+        self.assertIsNone(index.suggest('あ'))
+
+
+class BookSnapshotAPITest(TestCase):
+    """GET /api/books/snapshot/ — 蔵書スナップショットのテスト"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.url = '/api/books/snapshot/'
+        library_snapshot.invalidate()
+        self.book1 = Book.objects.create(isbn='9784000000001', title='Harry Potter')
+        self.book2 = Book.objects.create(isbn='9784000000002', title='ﾄﾞﾗえもん')
+
+    def tearDown(self):
+        library_snapshot.invalidate()
+
+    def _get(self, **extra):
+        return self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip, deflate', **extra)
+
+    def _books(self, response):
+        return json.loads(gzip.decompress(response.content))['books']
+
+    def test_snapshot_gzip(self):
+        response = self._get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(self._books(response), [
+            [self.book1.pk, 'Harry Potter', 'harry potter', '9784000000001', None],
+            [self.book2.pk, 'ﾄﾞﾗえもん', 'ドラえもん', '9784000000002', None],
+        ])
+
+    def test_snapshot_without_gzip(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Content-Encoding', response)
+        data = json.loads(response.content)
+        self.assertEqual(len(data['books']), 2)
+        self.assertEqual(response['ETag'], f'"{data["version"]}"')
+
+    def test_not_modified(self):
+        etag = self._get()['ETag']
+        with self.assertNumQueries(0):
+            response = self._get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+
+    def test_reflects_create_update_and_delete(self):
+        etag = self._get()['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            book3 = Book.objects.create(isbn='9784000000003', title='ワンピース')
+        response = self._get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn(
+            [book3.pk, 'ワンピース', 'ワンピース', '9784000000003', None], self._books(response),
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            book3.title = 'ONE PIECE'
+            book3.cover_image_url = 'https://example.com/op.jpg'
+            book3.save()
+            self.book1.delete()
+        books = self._books(self._get())
+        self.assertIn(
+            [book3.pk, 'ONE PIECE', 'one piece', '9784000000003', 'https://example.com/op.jpg'],
+            books,
+        )
+        self.assertNotIn(self.book1.pk, [row[0] for row in books])
+
+    def test_match_key_follows_javascript_lowercase(self):
+        # クライアントの toLowerCase と同じ結果にする（casefold ではない）
+        self.assertEqual(match_key(' Straße '), 'straße')
+        self.assertEqual(match_key('ΟΔΟΣ'), 'οδος')
+        self.assertEqual(match_key('ＡＢＣ'), 'abc')
+
+    def test_workers_converge_after_change(self):
+        # 2つのワーカープロセスのスナップショット
+        worker1, worker2 = LibrarySnapshot(), LibrarySnapshot()
+        version = worker1.artifact().version
+        self.assertEqual(worker2.artifact().version, version)
+        # worker1 のプロセスでの更新（シグナルは worker1 にだけ届く）
+        self.book1.title = 'ハリー・ポッター'
+        Book.objects.filter(pk=self.book1.pk).update(title=self.book1.title)
+        worker1.apply(
+            [(self.book1.pk, self.book1.title, self.book1.isbn, None)], [],
+            _bump_in_other_process(),
+        )
+        self.assertNotEqual(worker1.artifact().version, version)
+        with self.settings(LIBRARY_GENERATION_POLL_INTERVAL=0):
+            self.assertEqual(worker2.artifact().version, worker1.artifact().version)
+
+    @override_settings(LIBRARY_GENERATION_POLL_INTERVAL=0)
+    def test_reflects_bulk_change_from_other_process(self):
+        etag = self._get()['ETag']
+        Book.objects.filter(pk=self.book1.pk).delete()
+        _bump_in_other_process()
+        response = self._get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row[0] for row in self._books(response)], [self.book2.pk])
+
+    def test_unchanged_save_keeps_etag(self):
+        etag = self._get()['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book1.save()
+        self.assertEqual(self._get()['ETag'], etag)
+
+    def test_artifact_is_reused(self):
+        library_snapshot.artifact()
+        with patch('books.snapshot.gzip.compress') as mock_compress:
+            self._get()
+            self._get()
+        mock_compress.assert_not_called()
+
+    @patch('books.views.library_snapshot', LibrarySnapshot(max_entries=1))
+    def test_too_many_books(self):
+        response = self._get()
+        self.assertEqual(response.status_code, 404)
+
+
+class BookBatchAPITest(TestCase):
+    """POST /api/books/batch/ — 一括操作のテスト"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.url = '/api/books/batch/'
+        self.books = [
+            Book.objects.create(isbn=f'978400000000{i}', title=f'本{i}') for i in range(5)
+        ]
+
+    def _post(self, operations):
+        return self.client.post(self.url, {'operations': operations}, format='json')
+
+    def test_delete_by_id_and_isbn(self):
+        response = self._post([
+            {'op': 'delete', 'id': self.books[0].pk},
+            {'op': 'delete', 'isbn': self.books[1].isbn},
+            {'op': 'delete', 'id': 99999},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [r['status'] for r in response.data['results']],
+            ['deleted', 'deleted', 'not_found'],
+        )
+        self.assertEqual(response.data['results'][1]['id'], self.books[1].pk)
+        self.assertEqual(Book.objects.count(), 3)
+
+    def test_delete_same_book_twice(self):
+        response = self._post([
+            {'op': 'delete', 'id': self.books[0].pk},
+            {'op': 'delete', 'isbn': self.books[0].isbn},
+        ])
+        self.assertEqual(
+            [r['status'] for r in response.data['results']], ['deleted', 'not_found'],
+        )
+
+    def test_delete_query_count_is_constant(self):
+        # 対象取得 + セーブポイント + ロック + 削除対象の収集 + DELETE + 世代番号
+        # + セーブポイント解放
+        with self.assertNumQueries(7):
+            self._post([{'op': 'delete', 'id': self.books[0].pk}])
+        with self.assertNumQueries(7):
+            self._post([{'op': 'delete', 'id': book.pk} for book in self.books[1:]])
+        self.assertEqual(Book.objects.count(), 0)
+
+    @patch('books.views.lookup_book_by_isbn')
+    def test_relookup(self, mock_lookup):
+        mock_lookup.side_effect = lambda isbn, **kwargs: {
+            self.books[0].isbn: {'title': '新しい本0', 'cover_image_url': 'https://example.com/0.jpg'},
+            self.books[1].isbn: {'title': '本1', 'cover_image_url': None},
+            self.books[2].isbn: None,
+        }.get(isbn)
+        response = self._post([
+            {'op': 'relookup', 'id': self.books[0].pk},
+            {'op': 'relookup', 'id': self.books[1].pk},
+            {'op': 'relookup', 'isbn': self.books[2].isbn},
+        ])
+        results = response.data['results']
+        self.assertEqual([r['status'] for r in results], ['updated', 'unchanged', 'not_found'])
+        self.assertEqual(results[0]['book']['title'], '新しい本0')
+        self.books[0].refresh_from_db()
+        self.assertEqual(self.books[0].title, '新しい本0')
+        self.assertIsNotNone(self.books[0].refreshed_at)
+
+    @patch('books.views.lookup_book_by_isbn')
+    def test_relookup_upstream_error_is_per_item(self, mock_lookup):
+        mock_lookup.side_effect = requests.exceptions.Timeout()
+        response = self._post([
+            {'op': 'relookup', 'id': self.books[0].pk},
+            {'op': 'delete', 'id': self.books[1].pk},
+        ])
+        results = response.data['results']
+        self.assertEqual([r['status'] for r in results], ['error', 'deleted'])
+        self.assertEqual(results[0]['error'], 'みつかりませんでした')
+        self.assertFalse(results[0]['retryable'])
+        self.assertFalse(Book.objects.filter(pk=self.books[1].pk).exists())
+
+    @override_settings(
+        UPSTREAM_RATE_LIMITS={'ndl': {'rate': 0.01, 'capacity': 2}},
+        UPSTREAM_RATE_LIMIT_BLOCK=True, UPSTREAM_RATE_LIMIT_TIMEOUT=60,
+    )
+    @patch('books.services.requests.get')
+    def test_relookup_does_not_wait_for_rate_limit(self, mock_get):
+        cache.clear()
+        mock_get.return_value = _mock_ndl_response(NDL_XML_NO_ITEM)
+        started = time.monotonic()
+        response = self._post([{'op': 'relookup', 'id': book.pk} for book in self.books[:4]])
+        # トークンの補充を待たず、足りなかった分は後で送り直せるエラーにする
+        self.assertLess(time.monotonic() - started, 5)
+        results = response.data['results']
+        self.assertEqual(
+            sorted(r['status'] for r in results), ['error', 'error', 'not_found', 'not_found'],
+        )
+        for result in results:
+            if result['status'] == 'error':
+                self.assertEqual(result['error'], 'いまはこんでいます。すこしまってからためしてね')
+                self.assertTrue(result['retryable'])
+
+    @patch('books.views.lookup_book_by_isbn')
+    def test_relookup_then_delete_same_book(self, mock_lookup):
+        mock_lookup.return_value = {'title': '新しい本0', 'cover_image_url': None}
+        response = self._post([
+            {'op': 'relookup', 'id': self.books[0].pk},
+            {'op': 'delete', 'isbn': self.books[0].isbn},
+        ])
+        results = response.data['results']
+        self.assertEqual([r['status'] for r in results], ['skipped', 'deleted'])
+        self.assertNotIn('book', results[0])
+        self.assertFalse(Book.objects.filter(pk=self.books[0].pk).exists())
+
+    @patch('books.views.lookup_book_by_isbn')
+    def test_target_deleted_by_other_request(self, mock_lookup):
+        mock_lookup.return_value = {'title': '新しい本0', 'cover_image_url': None}
+        lock = Book.objects.select_for_update
+
+        def delete_before_lock(*args, **kwargs):
+            # 外部APIの待ち時間中に別のリクエストで削除された
+            Book.objects.filter(pk=self.books[0].pk).delete()
+            return lock(*args, **kwargs)
+
+        with patch.object(Book.objects, 'select_for_update', side_effect=delete_before_lock):
+            response = self._post([
+                {'op': 'relookup', 'id': self.books[0].pk},
+                {'op': 'delete', 'id': self.books[1].pk},
+            ])
+        results = response.data['results']
+        self.assertEqual([r['status'] for r in results], ['not_found', 'deleted'])
+        self.assertNotIn('book', results[0])
+        self.assertFalse(Book.objects.filter(pk=self.books[1].pk).exists())
+
+    def test_invalid_operations(self):
+        for operations in (
+            [],
+            [{'op': 'archive', 'id': 1}],
+            [{'op': 'delete'}],
+            [{'op': 'delete', 'id': 1, 'isbn': '9784000000001'}],
+        ):
+            with self.subTest(operations=operations):
+                self.assertEqual(self._post(operations).status_code, 400)
+
+
 # --- 外部API連携テスト ---
 
+class LookupPreviewAPITest(TestCase):
+    """GET /api/lookup/<isbn>/ — 登録前のプレビューのテスト"""
+
+    def setUp(self):
+        self.client = APIClient()
+        cache.clear()
+
+    @patch('books.views.lookup_book_by_isbn')
+    def test_preview_then_create_without_upstream_call(self, mock_lookup):
+        mock_lookup.return_value = {
+            'title': 'テストの本',
+            'cover_image_url': 'https://example.com/cover.jpg',
+        }
+        response = self.client.get('/api/lookup/9784000000001/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            'isbn': '9784000000001',
+            'title': 'テストの本',
+            'cover_image_url': 'https://example.com/cover.jpg',
+        })
+        self.assertFalse(Book.objects.exists())
+
+        response = self.client.post('/api/books/', {'isbn': '9784000000001'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['title'], 'テストの本')
+        mock_lookup.assert_called_once_with('9784000000001')
+
+    @patch('books.views.lookup_book_by_isbn')
+    def test_not_found_is_stored(self, mock_lookup):
+        mock_lookup.return_value = None
+        response = self.client.get('/api/lookup/9784000000001/')
+        self.assertEqual(response.status_code, 404)
+
+        response = self.client.post('/api/books/', {'isbn': '9784000000001'}, format='json')
+        self.assertEqual(response.status_code, 404)
+        mock_lookup.assert_called_once()
+
+    @patch('books.views.lookup_book_by_isbn')
+    def test_upstream_error_is_not_stored(self, mock_lookup):
+        mock_lookup.side_effect = [
+            requests.exceptions.Timeout(),
+            {'title': 'テストの本', 'cover_image_url': None},
+        ]
+        response = self.client.get('/api/lookup/9784000000001/')
+        self.assertEqual(response.status_code, 504)
+
+        response = self.client.get('/api/lookup/9784000000001/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(mock_lookup.call_count, 2)
+
+    @patch('books.views.lookup_book_by_isbn')
+    def test_already_registered(self, mock_lookup):
+        Book.objects.create(isbn='9784000000001', title='既存の本')
+        response = self.client.get('/api/lookup/9784000000001/')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['book']['title'], '既存の本')
+        mock_lookup.assert_not_called()
+
+    def test_invalid_isbn(self):
+        response = self.client.get('/api/lookup/97840000/')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/api/lookup/978400000000x/')
+        self.assertEqual(response.status_code, 400)
+
+    def test_concurrent_lookups_share_one_upstream_call(self):
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def slow_lookup(isbn):
+            calls.append(isbn)
+            started.set()
+            release.wait(5)
+            return {'title': 'テストの本', 'cover_image_url': None}
+
+        results = []
+        first = threading.Thread(
+            target=lambda: results.append(shared_lookup('9784000000001', slow_lookup)),
+        )
+        first.start()
+        started.wait(5)
+        # 検索中に届いたリクエストは外部APIを呼ばずに結果を待つ
+        second = threading.Thread(
+            target=lambda: results.append(shared_lookup('9784000000001', slow_lookup)),
+        )
+        second.start()
+        release.set()
+        first.join(5)
+        second.join(5)
+
+        self.assertEqual(calls, ['9784000000001'])
+        self.assertEqual(len(results), 2)
+        self.assertEqual(results[0], results[1])
+
+
 NDL_XML_WITH_ITEM = '''\
 <?xml version="1.0" encoding="UTF-8"?>
 <rss xmlns:dc="http://purl.org/dc/elements/1.1/"
@@ -223,6 +819,12 @@ NDL_XML_EMPTY_TITLE = '''\
 </rss>'''.encode('utf-8')
 
 
+def _bump_in_other_process():
+    """他のプロセスが世代番号を進めたことを再現する（自分のプロセスの記憶は更新しない）"""
+    LibraryGeneration.objects.filter(pk=1).update(value=F('value') + 1)
+    return LibraryGeneration.objects.get(pk=1).value
+
+
 def _mock_ndl_response(content, status_code=200):
     mock_resp = MagicMock()
     mock_resp.status_code = status_code
@@ -242,6 +844,9 @@ def _mock_google_response(json_data, status_code=200):
 class FetchBookFromNDLTest(TestCase):
     """NDLサーチAPI連携のテスト"""
 
+    def setUp(self):
+        cache.clear()
+
     @patch('books.services.requests.get')
     def test_success(self, mock_get):
         mock_get.return_value = _mock_ndl_response(NDL_XML_WITH_ITEM)
@@ -285,6 +890,9 @@ class FetchBookFromNDLTest(TestCase):
 class FetchCoverFromGoogleBooksTest(TestCase):
     """Google Books API連携のテスト"""
 
+    def setUp(self):
+        cache.clear()
+
     @patch('books.services.requests.get')
     def test_success_thumbnail(self, mock_get):
         mock_get.return_value = _mock_google_response({
@@ -398,3 +1006,761 @@ class LookupBookByISBNTest(TestCase):
         result = lookup_book_by_isbn('9784000000001')
         self.assertEqual(result['cover_image_url'], 'https://ndl.go.jp/cover.jpg')
         mock_google.assert_not_called()
+
+
+@override_settings(
+    UPSTREAM_RATE_LIMITS={'test': {'rate': 10.0, 'capacity': 2}},
+    UPSTREAM_RATE_LIMIT_BLOCK=False,
+)
+class RateLimitTest(TestCase):
+    """外部APIレート制限（トークンバケット）のテスト"""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_allows_burst_up_to_capacity(self):
+        throttle('test')
+        throttle('test')
+        with self.assertRaises(RateLimitExceeded):
+            throttle('test')
+        self.assertEqual(
+            get_rate_limit_stats()['test'],
+            {'allowed': 2, 'waited': 0, 'throttled': 1},
+        )
+
+    def test_unconfigured_provider_is_not_limited(self):
+        for _ in range(10):
+            throttle('unknown')
+
+    @patch('books.services.time.sleep')
+    @patch('books.services.time.time')
+    def test_blocking_waits_for_refill(self, mock_time, mock_sleep):
+        clock = [1000.0]
+        mock_time.side_effect = lambda: clock[0]
+        mock_sleep.side_effect = lambda seconds: clock.__setitem__(0, clock[0] + seconds)
+
+        bucket = TokenBucket('test', rate=10.0, capacity=1)
+        bucket.acquire(block=False)
+        bucket.acquire(block=True, timeout=1)
+        mock_sleep.assert_called_once()
+        self.assertAlmostEqual(mock_sleep.call_args[0][0], 0.1)
+        self.assertEqual(get_rate_limit_stats()['test']['waited'], 1)
+
+    def test_blocking_deadline_exceeded(self):
+        bucket = TokenBucket('test', rate=0.01, capacity=1)
+        bucket.acquire(block=True, timeout=0.01)
+        with self.assertRaises(RateLimitExceeded):
+            bucket.acquire(block=True, timeout=0.01)
+
+    def test_fail_fast_does_not_wait_for_contended_lock(self):
+        bucket = TokenBucket('test', rate=1.0, capacity=5)
+        cache.set(bucket._lock_key, 'other', timeout=60)
+        start = time.monotonic()
+        with self.assertRaises(RateLimitExceeded):
+            bucket.acquire(block=False)
+        self.assertLess(time.monotonic() - start, 0.5)
+
+    def test_lock_held_by_another_process_is_not_released(self):
+        bucket = TokenBucket('test', rate=1.0, capacity=5)
+        original_set = cache.set
+
+        def expire_lock_midway(key, *args, **kwargs):
+            # 状態の保存中にロックの期限が切れ、別のプロセスが取り直した
+            original_set(bucket._lock_key, 'other', timeout=60)
+            return original_set(key, *args, **kwargs)
+
+        with patch.object(cache, 'set', side_effect=expire_lock_midway):
+            self.assertEqual(bucket._try_take(), 0)
+        self.assertEqual(cache.get(bucket._lock_key), 'other')
+
+    @patch('books.services.requests.get')
+    def test_fetch_fails_fast_without_calling_api(self, mock_get):
+        with self.settings(UPSTREAM_RATE_LIMITS={'ndl': {'rate': 0.01, 'capacity': 1}}):
+            mock_get.return_value = _mock_ndl_response(NDL_XML_WITH_ITEM)
+            fetch_book_from_ndl('9784000000001')
+            with self.assertRaises(RateLimitExceeded):
+                fetch_book_from_ndl('9784000000001')
+        self.assertEqual(mock_get.call_count, 1)
+
+
+class RefreshBooksCommandTest(TestCase):
+    """refresh_books コマンド（書籍情報の再取得）のテスト"""
+
+    def setUp(self):
+        tmpdir = tempfile.mkdtemp()
+        self.checkpoint = os.path.join(tmpdir, 'refresh.checkpoint')
+        self.no_cover = Book.objects.create(isbn='9784000000001', title='表紙なし')
+        self.fresh = Book.objects.create(
+            isbn='9784000000002', title='最新', cover_image_url='https://example.com/a.jpg',
+            refreshed_at=timezone.now(),
+        )
+
+    def _call(self, *args):
+        out = StringIO()
+        call_command(
+            'refresh_books', '--checkpoint', self.checkpoint, *args,
+            stdout=out, stderr=StringIO(),
+        )
+        return out.getvalue()
+
+    @patch('books.management.commands.refresh_books.lookup_book_by_isbn')
+    def test_backfills_missing_cover(self, mock_lookup):
+        mock_lookup.return_value = {
+            'title': '表紙なし', 'cover_image_url': 'https://example.com/b.jpg',
+        }
+        output = self._call()
+        mock_lookup.assert_called_once_with('9784000000001', block=True, timeout=math.inf)
+        self.no_cover.refresh_from_db()
+        self.assertEqual(self.no_cover.cover_image_url, 'https://example.com/b.jpg')
+        self.assertIsNotNone(self.no_cover.refreshed_at)
+        self.assertIn('更新 1件', output)
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    @patch('books.management.commands.refresh_books.lookup_book_by_isbn')
+    def test_keeps_existing_cover_when_lookup_has_none(self, mock_lookup):
+        Book.objects.filter(pk=self.fresh.pk).update(
+            refreshed_at=timezone.now() - timedelta(days=60),
+        )
+        mock_lookup.return_value = {'title': '最新（改訂版）', 'cover_image_url': None}
+        self._call()
+        self.fresh.refresh_from_db()
+        self.assertEqual(self.fresh.title, '最新（改訂版）')
+        self.assertEqual(self.fresh.cover_image_url, 'https://example.com/a.jpg')
+
+    @patch('books.management.commands.refresh_books.lookup_book_by_isbn')
+    def test_retries_missing_cover_after_interval(self, mock_lookup):
+        mock_lookup.return_value = {'title': '表紙なし', 'cover_image_url': None}
+        Book.objects.filter(pk=self.no_cover.pk).update(refreshed_at=timezone.now())
+        self._call()
+        mock_lookup.assert_not_called()
+
+        Book.objects.filter(pk=self.no_cover.pk).update(
+            refreshed_at=timezone.now() - timedelta(days=2),
+        )
+        self._call()
+        mock_lookup.assert_called_once_with('9784000000001', block=True, timeout=math.inf)
+
+    @patch('books.management.commands.refresh_books.lookup_book_by_isbn')
+    def test_dry_run_does_not_write(self, mock_lookup):
+        mock_lookup.return_value = {
+            'title': '表紙なし', 'cover_image_url': 'https://example.com/b.jpg',
+        }
+        output = self._call('--dry-run')
+        self.no_cover.refresh_from_db()
+        self.assertIsNone(self.no_cover.cover_image_url)
+        self.assertIsNone(self.no_cover.refreshed_at)
+        self.assertIn('[dry-run]', output)
+
+    @patch('books.management.commands.refresh_books.lookup_book_by_isbn')
+    def test_failed_lookup_is_retried_next_time(self, mock_lookup):
+        mock_lookup.side_effect = requests.exceptions.Timeout()
+        output = self._call()
+        self.no_cover.refresh_from_db()
+        self.assertIsNone(self.no_cover.refreshed_at)
+        self.assertIn('失敗 1件', output)
+
+    @override_settings(
+        UPSTREAM_RATE_LIMITS={
+            'ndl': {'rate': 20.0, 'capacity': 1},
+            'google_books': {'rate': 20.0, 'capacity': 1},
+        },
+        UPSTREAM_RATE_LIMIT_TIMEOUT=0,
+    )
+    @patch('books.services.requests.get')
+    def test_rate_limit_slows_down_instead_of_failing(self, mock_get):
+        cache.clear()
+        Book.objects.bulk_create(
+            Book(isbn=f'978400000010{i}', title=f'本{i}') for i in range(4)
+        )
+        mock_get.side_effect = lambda url, **kwargs: (
+            _mock_ndl_response(NDL_XML_WITH_ITEM) if 'ndl' in url
+            else _mock_google_response({'totalItems': 0})
+        )
+        # 同時実行数がレートを超えても、待たされるだけで失敗しない
+        output = self._call('--concurrency', '4')
+        self.assertIn('失敗 0件', output)
+        self.assertEqual(mock_get.call_count, 10)  # 5冊 x（NDL + Google Books）
+        self.assertFalse(Book.objects.filter(refreshed_at__isnull=True).exists())
+
+    @patch('books.management.commands.refresh_books.lookup_book_by_isbn')
+    def test_resumes_from_checkpoint(self, mock_lookup):
+        mock_lookup.return_value = None
+        with open(self.checkpoint, 'w') as f:
+            f.write(str(self.no_cover.pk))
+        self._call()
+        mock_lookup.assert_not_called()
+
+        with open(self.checkpoint, 'w') as f:
+            f.write(str(self.no_cover.pk))
+        self._call('--restart')
+        mock_lookup.assert_called_once_with('9784000000001', block=True, timeout=math.inf)
+
+    @patch('books.management.commands.refresh_books.lookup_book_by_isbn')
+    def test_bulk_update_in_constant_queries(self, mock_lookup):
+        mock_lookup.return_value = {'title': '新しいタイトル', 'cover_image_url': None}
+        Book.objects.bulk_create([
+            Book(isbn=f'97850000000{i:02d}', title=f'本{i}') for i in range(20)
+        ])
+        # 対象取得 + bulk_update（トランザクションのセーブポイント含む）+ 世代番号 + 空バッチ確認
+        with self.assertNumQueries(6):
+            self._call('--batch-size', '100')
+        self.assertEqual(Book.objects.filter(title='新しいタイトル').count(), 21)
+
+    @patch('books.management.commands.refresh_books.lookup_book_by_isbn')
+    def test_bumps_generation_per_batch(self, mock_lookup):
+        mock_lookup.side_effect = [
+            {'title': '新しいタイトル', 'cover_image_url': None},
+            KeyboardInterrupt(),
+        ]
+        Book.objects.filter(pk=self.fresh.pk).update(refreshed_at=None)
+        generation = read_generation()
+        # 2バッチ目で中断しても、1バッチ目の変更はコミット済みの世代番号で伝わる
+        with self.assertRaises(KeyboardInterrupt):
+            self._call('--batch-size', '1')
+        self.assertEqual(read_generation(), generation + 1)
+
+
+class SeedBooksCommandTest(TestCase):
+    """seed_books コマンド（大量データ投入）のテスト"""
+
+    def test_isbn13_check_digit(self):
+        # 「ぐりとぐら」 ISBN: 9784834000825
+        self.assertEqual(isbn13('978483400082'), '9784834000825')
+
+    def test_seed_books(self):
+        call_command('seed_books', count=120, batch_size=50, seed=1, stdout=StringIO())
+        self.assertEqual(Book.objects.count(), 120)
+
+        books = list(Book.objects.order_by('pk'))
+        for book in books:
+            self.assertEqual(len(book.isbn), 13)
+            self.assertEqual(isbn13(book.isbn[:12]), book.isbn)
+            self.assertTrue(book.title)
+        # 登録日時はIDの順に過去から分散している
+        self.assertLess(books[0].created_at, timezone.now() - timedelta(days=365))
+        self.assertEqual(
+            [b.pk for b in books],
+            [b.pk for b in sorted(books, key=lambda b: b.created_at)],
+        )
+
+    def test_seed_books_start_avoids_duplicates(self):
+        call_command('seed_books', count=10, seed=1, stdout=StringIO())
+        call_command('seed_books', count=10, start=10, seed=1, stdout=StringIO())
+        self.assertEqual(Book.objects.count(), 20)
+
+    def test_seed_books_bumps_generation(self):
+        generation = read_generation()
+        call_command('seed_books', count=1, seed=1, stdout=StringIO())
+        self.assertEqual(read_generation(), generation + 1)
+
+
+class IdempotencyKeyTest(TestCase):
+    """POST /api/books/ の Idempotency-Key ヘッダーのテスト"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.url = '/api/books/'
+        cache.clear()
+
+    def _post(self, isbn='9784000000001', key='key-1'):
+        return self.client.post(self.url, {'isbn': isbn}, HTTP_IDEMPOTENCY_KEY=key)
+
+    @patch('books.views.lookup_book_by_isbn')
+    def test_replay_returns_stored_response(self, mock_lookup):
+        mock_lookup.return_value = {'title': 'テストの本', 'cover_image_url': None}
+        first = self._post()
+        second = self._post()
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(mock_lookup.call_count, 1)
+
+    @patch('books.views.lookup_book_by_isbn')
+    def test_different_keys_are_processed_separately(self, mock_lookup):
+        mock_lookup.return_value = {'title': 'テストの本', 'cover_image_url': None}
+        self._post(key='key-1')
+        response = self._post(key='key-2')
+        self.assertEqual(response.status_code, 409)
+
+    @patch('books.views.lookup_book_by_isbn')
+    def test_key_reused_with_different_body(self, mock_lookup):
+        mock_lookup.return_value = {'title': 'テストの本', 'cover_image_url': None}
+        self._post(isbn='9784000000001')
+        response = self._post(isbn='9784000000002')
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(mock_lookup.call_count, 1)
+
+    @patch('books.views.lookup_book_by_isbn')
+    def test_server_error_is_not_stored(self, mock_lookup):
+        mock_lookup.side_effect = [
+            requests.exceptions.Timeout(),
+            {'title': 'テストの本', 'cover_image_url': None},
+        ]
+        self.assertEqual(self._post().status_code, 504)
+        self.assertEqual(self._post().status_code, 201)
+
+    def test_key_too_long(self):
+        response = self._post(key='x' * 256)
+        self.assertEqual(response.status_code, 400)
+
+    @patch('books.idempotency.time.sleep')
+    @patch('books.views.lookup_book_by_isbn')
+    def test_waits_for_in_flight_request(self, mock_lookup, mock_sleep):
+        mock_lookup.return_value = {'title': 'テストの本', 'cover_image_url': None}
+        self._post()
+        cache_key = idempotency_cache_key('key-1')
+        completed = cache.get(cache_key)
+
+        # 同じキーのリクエストが処理中（目印のみ）の状態にし、待機中に完了させる
+        cache.set(cache_key, {'fingerprint': completed['fingerprint']})
+        mock_sleep.side_effect = lambda seconds: cache.set(cache_key, completed)
+
+        response = self._post()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response['Idempotent-Replayed'], 'true')
+        mock_sleep.assert_called_once()
+        self.assertEqual(mock_lookup.call_count, 1)
+
+
+@override_settings(DATABASE_REPLICAS=['replica1', 'replica2'])
+class ReplicaRouterTest(TestCase):
+    """読み取りレプリカへの振り分けのテスト"""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.router = db_router.ReplicaRouter()
+        patcher = patch('config.db_router._is_healthy', return_value=True)
+        self.mock_healthy = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _run(self, request, reads=1, write=False):
+        """ミドルウェア経由でビューの代わりに読み書きの振り分け先を記録する"""
+        used = []
+
+        def view(request):
+            if write:
+                used.append(self.router.db_for_write(Book))
+            for _ in range(reads):
+                used.append(self.router.db_for_read(Book))
+            return HttpResponse()
+
+        response = db_router.ReplicaRoutingMiddleware(view)(request)
+        return used, response
+
+    def test_get_uses_replicas_round_robin(self):
+        first, _ = self._run(self.factory.get('/api/books/'), reads=2)
+        second, _ = self._run(self.factory.get('/api/books/'))
+        # 1リクエスト内では同じレプリカを使い、リクエストごとに切り替える
+        self.assertEqual(first[0], first[1])
+        self.assertIn(first[0], ('replica1', 'replica2'))
+        self.assertNotEqual(first[0], second[0])
+
+    def test_post_uses_primary_and_sets_pin_cookie(self):
+        used, response = self._run(self.factory.post('/api/books/'), write=True)
+        self.assertEqual(used, ['default', 'default'])
+        self.assertIn(db_router.PIN_COOKIE_NAME, response.cookies)
+
+    def test_pinned_client_reads_primary(self):
+        request = self.factory.get('/api/books/')
+        request.COOKIES[db_router.PIN_COOKIE_NAME] = '1'
+        used, response = self._run(request)
+        self.assertEqual(used, ['default'])
+        self.assertNotIn(db_router.PIN_COOKIE_NAME, response.cookies)
+
+    def test_unhealthy_replica_is_skipped(self):
+        self.mock_healthy.side_effect = lambda alias: alias == 'replica2'
+        for _ in range(3):
+            used, _ = self._run(self.factory.get('/api/books/'))
+            self.assertEqual(used, ['replica2'])
+
+    def test_all_replicas_down_falls_back_to_primary(self):
+        self.mock_healthy.return_value = False
+        used, _ = self._run(self.factory.get('/api/books/'))
+        self.assertEqual(used, ['default'])
+
+    def test_async_view(self):
+        used = []
+
+        async def view(request):
+            # 非同期ビューのクエリは sync_to_async のスレッドで振り分けられる
+            used.append(await sync_to_async(self.router.db_for_read)(Book))
+            used.append(await sync_to_async(self.router.db_for_write)(Book))
+            return HttpResponse()
+
+        factory = AsyncRequestFactory()
+        response = async_to_sync(db_router.ReplicaRoutingMiddleware(view))(
+            factory.post('/api/books/'),
+        )
+        self.assertEqual(used, ['default', 'default'])
+        self.assertIn(db_router.PIN_COOKIE_NAME, response.cookies)
+
+        used.clear()
+        async_to_sync(db_router.ReplicaRoutingMiddleware(view))(factory.get('/api/books/'))
+        self.assertIn(used[0], ('replica1', 'replica2'))
+
+    def test_outside_request_uses_primary(self):
+        self.assertEqual(self.router.db_for_read(Book), 'default')
+
+    def test_title_index_and_snapshot_build_from_primary(self):
+        Book.objects.create(isbn='9784000000001', title='あいうえお')
+        # レプリカに振り分けられる読み取りの中でも、構築はプライマリから読む
+        # （テストのレプリカは存在しない接続のため、振り分けられると失敗する）
+        token = db_router._routing_state.set(db_router._RoutingState(allow_replica=True))
+        try:
+            with self.settings(DATABASE_ROUTERS=['config.db_router.ReplicaRouter']):
+                index, snapshot = TitlePrefixIndex(), LibrarySnapshot()
+                self.assertTrue(index.build())
+                self.assertTrue(snapshot.build())
+        finally:
+            db_router._routing_state.reset(token)
+        self.assertEqual(index.suggest('あ'), ['あいうえお'])
+
+
+class AsyncBookAPITest(TestCase):
+    """非同期ビュー（ASGI用）のテスト"""
+
+    def setUp(self):
+        self.factory = AsyncRequestFactory()
+        cache.clear()
+
+    def _post(self, isbn, **extra):
+        return self.factory.post(
+            '/api/books/', {'isbn': isbn}, content_type='application/json', **extra,
+        )
+
+    @patch('books.async_views.alookup_book_by_isbn', new_callable=AsyncMock)
+    async def test_create_success(self, mock_lookup):
+        mock_lookup.return_value = {'title': 'テストの本', 'cover_image_url': None}
+        response = await async_views.book_list_create(self._post('9784000000001'))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(json.loads(response.content)['title'], 'テストの本')
+        self.assertTrue(await Book.objects.filter(isbn='9784000000001').aexists())
+
+    @patch('books.async_views.alookup_book_by_isbn', new_callable=AsyncMock)
+    async def test_create_duplicate(self, mock_lookup):
+        await Book.objects.acreate(isbn='9784000000001', title='既存の本')
+        response = await async_views.book_list_create(self._post('9784000000001'))
+        self.assertEqual(response.status_code, 409)
+        self.assertIn('book', json.loads(response.content))
+        mock_lookup.assert_not_called()
+
+    async def test_create_invalid_isbn(self):
+        response = await async_views.book_list_create(self._post('abc'))
+        self.assertEqual(response.status_code, 400)
+
+    async def test_create_invalid_json(self):
+        request = self.factory.post('/api/books/', '{', content_type='application/json')
+        response = await async_views.book_list_create(request)
+        self.assertEqual(response.status_code, 400)
+
+    @patch('books.async_views.alookup_book_by_isbn', new_callable=AsyncMock)
+    async def test_create_timeout(self, mock_lookup):
+        mock_lookup.side_effect = requests.exceptions.Timeout()
+        response = await async_views.book_list_create(self._post('9784000000001'))
+        self.assertEqual(response.status_code, 504)
+
+    @patch('books.async_views.alookup_book_by_isbn', new_callable=AsyncMock)
+    async def test_create_idempotent_replay(self, mock_lookup):
+        mock_lookup.return_value = {'title': 'テストの本', 'cover_image_url': None}
+        headers = {'Idempotency-Key': 'async-key'}
+        first = await async_views.book_list_create(self._post('9784000000001', headers=headers))
+        second = await async_views.book_list_create(self._post('9784000000001', headers=headers))
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(json.loads(second.content), json.loads(first.content))
+        self.assertEqual(mock_lookup.call_count, 1)
+
+    @patch('books.async_views.alookup_book_by_isbn', new_callable=AsyncMock)
+    async def test_lookup_preview_then_create(self, mock_lookup):
+        mock_lookup.return_value = {'title': 'テストの本', 'cover_image_url': None}
+        response = await async_views.lookup_preview(
+            self.factory.get('/api/lookup/9784000000001/'), isbn='9784000000001',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)['title'], 'テストの本')
+
+        response = await async_views.book_list_create(self._post('9784000000001'))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(mock_lookup.call_count, 1)
+
+    async def test_list_ordering(self):
+        await Book.objects.acreate(isbn='9784000000001', title='かきくけこ')
+        await Book.objects.acreate(isbn='9784000000002', title='あいうえお')
+        response = await async_views.book_list_create(
+            self.factory.get('/api/books/', {'ordering': 'title'}),
+        )
+        self.assertEqual(response.status_code, 200)
+        titles = [b['title'] for b in json.loads(response.content)]
+        self.assertEqual(titles, ['あいうえお', 'かきくけこ'])
+
+    async def test_search(self):
+        await Book.objects.acreate(isbn='9784000000001', title='ドラえもん')
+        await Book.objects.acreate(isbn='9784000000002', title='ワンピース')
+        response = await async_views.book_search(
+            self.factory.get('/api/books/search/', {'q': 'ドラ'}),
+        )
+        self.assertEqual([b['title'] for b in json.loads(response.content)], ['ドラえもん'])
+
+    async def test_delete(self):
+        book = await Book.objects.acreate(isbn='9784000000001', title='削除テスト')
+        response = await async_views.book_delete(
+            self.factory.delete(f'/api/books/{book.pk}/'), pk=book.pk,
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(await Book.objects.filter(pk=book.pk).aexists())
+
+        response = await async_views.book_delete(
+            self.factory.delete(f'/api/books/{book.pk}/'), pk=book.pk,
+        )
+        self.assertEqual(response.status_code, 404)
+
+    async def test_method_not_allowed(self):
+        response = await async_views.book_delete(self.factory.get('/api/books/1/'), pk=1)
+        self.assertEqual(response.status_code, 405)
+
+
+def _mock_async_client(handler):
+    return lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+class AsyncLookupBookByISBNTest(TestCase):
+    """非同期の外部API連携のテスト"""
+
+    def setUp(self):
+        cache.clear()
+
+    async def test_ndl_found_google_cover(self):
+        def handler(request):
+            if 'ndl' in request.url.host:
+                return httpx.Response(200, content=NDL_XML_WITH_ITEM)
+            return httpx.Response(200, json={
+                'totalItems': 1,
+                'items': [{'volumeInfo': {'imageLinks': {'thumbnail': 'http://example.com/c.jpg'}}}],
+            })
+
+        with patch('books.services.async_http_client', _mock_async_client(handler)):
+            result = await alookup_book_by_isbn('9784000000001')
+        self.assertEqual(result, {
+            'title': 'テストブック', 'cover_image_url': 'https://example.com/c.jpg',
+        })
+
+    async def test_ndl_not_found(self):
+        def handler(request):
+            return httpx.Response(200, content=NDL_XML_NO_ITEM)
+
+        with patch('books.services.async_http_client', _mock_async_client(handler)):
+            self.assertIsNone(await alookup_book_by_isbn('9784000000001'))
+
+    async def test_google_fails_gracefully(self):
+        def handler(request):
+            if 'ndl' in request.url.host:
+                return httpx.Response(200, content=NDL_XML_WITH_ITEM)
+            return httpx.Response(500)
+
+        with patch('books.services.async_http_client', _mock_async_client(handler)):
+            result = await alookup_book_by_isbn('9784000000001')
+        self.assertEqual(result['title'], 'テストブック')
+        self.assertIsNone(result['cover_image_url'])
+
+    async def test_ndl_timeout_raises_requests_timeout(self):
+        def handler(request):
+            raise httpx.ReadTimeout('timeout', request=request)
+
+        with patch('books.services.async_http_client', _mock_async_client(handler)):
+            with self.assertRaises(requests.exceptions.Timeout):
+                await alookup_book_by_isbn('9784000000001')
+
+    async def test_ndl_connection_error(self):
+        def handler(request):
+            raise httpx.ConnectError('refused', request=request)
+
+        with patch('books.services.async_http_client', _mock_async_client(handler)):
+            with self.assertRaises(requests.exceptions.ConnectionError):
+                await alookup_book_by_isbn('9784000000001')
+
+
+class ProfilingMiddlewareTest(TestCase):
+    """リクエスト単位のプロファイリングのテスト"""
+
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+        override = override_settings(
+            PROFILING_ENABLED=True,
+            PROFILING_HEADER_TOKENS=['secret'],
+            PROFILING_SAMPLE_RATE=0.0,
+            PROFILING_OUTPUT_DIR=self.output_dir,
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        self.client = APIClient()
+        cache.clear()
+
+    def _profile_files(self):
+        return sorted(os.listdir(self.output_dir))
+
+    def test_not_profiled_without_token(self):
+        response = self.client.get('/api/books/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(self._profile_files(), [])
+
+    def test_not_profiled_with_unknown_token(self):
+        self.client.get('/api/books/', HTTP_X_PROFILE='wrong')
+        self.assertEqual(self._profile_files(), [])
+
+    @patch('books.services.requests.get')
+    def test_profile_captures_queries_and_upstream_calls(self, mock_get):
+        mock_get.side_effect = [
+            _mock_ndl_response(NDL_XML_WITH_ITEM),
+            _mock_google_response({'totalItems': 0}),
+        ]
+        response = self.client.post(
+            '/api/books/', {'isbn': '9784000000001'}, HTTP_X_PROFILE='secret',
+        )
+        self.assertEqual(response.status_code, 201)
+        profile_id = response['X-Profile-Id']
+        self.assertEqual(
+            self._profile_files(),
+            [f'{profile_id}.collapsed', f'{profile_id}.json', f'{profile_id}.prof'],
+        )
+
+        with open(os.path.join(self.output_dir, f'{profile_id}.json')) as f:
+            meta = json.load(f)
+        self.assertEqual(meta['status_code'], 201)
+        self.assertTrue(any('INSERT' in q['sql'] for q in meta['queries']))
+        self.assertEqual(
+            [c['provider'] for c in meta['upstream_calls']], ['ndl', 'google_books'],
+        )
+
+        with open(os.path.join(self.output_dir, f'{profile_id}.collapsed')) as f:
+            lines = f.read().splitlines()
+        self.assertTrue(lines)
+        self.assertTrue(all(line and line.rsplit(' ', 1)[1].isdigit() for line in lines))
+        self.assertTrue(any('book_list_create' in line for line in lines))
+
+    def test_profiles_async_view(self):
+        Book.objects.create(isbn='9784000000001', title='テストブック')
+        middleware = ProfilingMiddleware(async_views.book_list_create)
+        request = AsyncRequestFactory().get('/api/books/', headers={'X-Profile': 'secret'})
+        response = async_to_sync(middleware)(request)
+        self.assertEqual(response.status_code, 200)
+        profile_id = response['X-Profile-Id']
+
+        with open(os.path.join(self.output_dir, f'{profile_id}.json')) as f:
+            meta = json.load(f)
+        self.assertTrue(any('books_book' in q['sql'] for q in meta['queries']))
+        # イベントループのスレッドで動く非同期ビューの処理が計測される
+        with open(os.path.join(self.output_dir, f'{profile_id}.collapsed')) as f:
+            self.assertIn('_book_list', f.read())
+
+    def test_collapsed_stacks_does_not_double_count_roots(self):
+        handler = ('handlers.py', 1, 'handler')
+        view = ('views.py', 1, 'view')
+        # view は計測開始前から実行中の関数（呼び出し元なし）と handler から1回ずつ呼ばれた
+        stats = SimpleNamespace(stats={
+            handler: (1, 1, 0.0, 0.05, {}),
+            view: (2, 2, 0.1, 0.1, {handler: (1, 1, 0.05, 0.05)}),
+        })
+        lines = dict(line.rsplit(' ', 1) for line in collapsed_stacks(stats).splitlines())
+        self.assertEqual(lines, {
+            'handler (handlers.py:1);view (views.py:1)': '50000',
+            'view (views.py:1)': '50000',
+        })
+
+    def test_collapsed_stacks_keeps_recursive_roots(self):
+        inner = ('exception.py', 1, 'inner')
+        middleware = ('middleware.py', 1, '__call__')
+        # inner -> __call__ -> inner の再帰（2回目の inner の時間は1回目の ct に含まれる）
+        stats = SimpleNamespace(stats={
+            inner: (1, 2, 0.1, 0.1, {middleware: (1, 1, 0.05, 0.05)}),
+            middleware: (1, 1, 0.0, 0.05, {inner: (1, 1, 0.0, 0.05)}),
+        })
+        lines = dict(line.rsplit(' ', 1) for line in collapsed_stacks(stats).splitlines())
+        self.assertEqual(lines, {'inner (exception.py:1)': '100000'})
+
+    def test_sampling(self):
+        with self.settings(PROFILING_SAMPLE_RATE=1.0):
+            response = APIClient().get('/api/books/')
+        self.assertIn('X-Profile-Id', response)
+
+    def test_list_profiles_command(self):
+        response = self.client.get('/api/books/', HTTP_X_PROFILE='secret')
+        profile_id = response['X-Profile-Id']
+
+        out = StringIO()
+        call_command('list_profiles', stdout=out)
+        self.assertIn(profile_id, out.getvalue())
+
+        out = StringIO()
+        call_command('list_profiles', profile_id, stdout=out)
+        self.assertIn('GET /api/books/ -> 200', out.getvalue())
+        self.assertIn('累積時間の大きい関数', out.getvalue())
+
+    @override_settings(PROFILING_ENABLED=False)
+    def test_disabled(self):
+        response = APIClient().get('/api/books/', HTTP_X_PROFILE='secret')
+        self.assertNotIn('X-Profile-Id', response)
+
+
+@override_settings(
+    INSTALLED_APPS=settings_api.INSTALLED_APPS,
+    MIDDLEWARE=settings_api.MIDDLEWARE,
+    TEMPLATES=settings_api.TEMPLATES,
+    REST_FRAMEWORK=settings_api.REST_FRAMEWORK,
+)
+class SlimAPISettingsTest(TestCase):
+    """API専用の軽量な設定（config/settings_api.py）で書籍APIが動くことのテスト"""
+
+    def setUp(self):
+        self.client = APIClient()
+        cache.clear()
+
+    def test_unused_apps_removed(self):
+        self.assertNotIn('django.contrib.admin', settings_api.INSTALLED_APPS)
+        self.assertNotIn('django.contrib.sessions', settings_api.INSTALLED_APPS)
+        self.assertIn('books', settings_api.INSTALLED_APPS)
+        self.assertNotIn(
+            'django.middleware.csrf.CsrfViewMiddleware', settings_api.MIDDLEWARE,
+        )
+        self.assertIn('corsheaders.middleware.CorsMiddleware', settings_api.MIDDLEWARE)
+
+    @patch('books.views.lookup_book_by_isbn')
+    def test_create_and_list(self, mock_lookup):
+        mock_lookup.return_value = {'title': 'テストの本', 'cover_image_url': None}
+        response = self.client.post('/api/books/', {'isbn': '9784000000001'}, format='json')
+        self.assertEqual(response.status_code, 201)
+
+        response = self.client.get('/api/books/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([b['title'] for b in response.json()], ['テストの本'])
+
+    def test_error_response_is_json(self):
+        response = self.client.delete('/api/books/9999/')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json(), {'error': 'みつかりませんでした'})
+
+    def _get_as_browser(self, settings_module):
+        """ブラウザと同じ Accept で別のプロセスからリクエストし、Content-Type を返す
+
+        DRF のレンダラーはビューの定義時に決まり override_settings では切り替わらないため、
+        設定モジュールを指定して起動したプロセスで確かめる。
+        """
+        script = (
+            'import django\n'
+            'from django.test import Client\n'
+            'django.setup()\n'
+            "response = Client().get('/api/lookup/abc/', "
+            "HTTP_ACCEPT='text/html,application/xhtml+xml,*/*;q=0.8')\n"
+            "print(response['Content-Type'])\n"
+        )
+        output = subprocess.run(
+            [sys.executable, '-c', script],
+            env={**os.environ, 'DJANGO_SETTINGS_MODULE': settings_module},
+            cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+        )
+        return output.stdout.strip()
+
+    def test_browsable_api_disabled(self):
+        self.assertTrue(self._get_as_browser('config.settings').startswith('text/html'))
+        self.assertEqual(self._get_as_browser('config.settings_api'), 'application/json')
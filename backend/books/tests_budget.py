@@ -0,0 +1,229 @@
+"""
+クエリ数・外部API呼び出し数・処理時間の予算（バジェット）テスト
+
+実行方法（Dockerコンテナ内）:
+  python manage.py test books.tests_budget --verbosity=2
+
+各エンドポイントの上限は BUDGETS の表にまとめて定義する。
+N+1クエリや遅い処理が入り込むと、実行されたSQLの一覧付きでテストが失敗する。
+上限を変更する場合はこの表を編集し、レビューで差分を確認すること。
+"""
+
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from unittest.mock import MagicMock, patch
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .models import Book
+from .services import fetch_book_from_ndl
+from .snapshot import library_snapshot
+from .suggest import title_index
+
+Budget = namedtuple('Budget', ['max_queries', 'max_upstream_calls', 'max_seconds'])
+
+# エンドポイントごとの上限（SQLクエリ数, 外部API呼び出し数, 処理時間[秒]）
+# 書籍の変更は世代番号の更新を、タイトル候補・スナップショットの構築は世代番号の読み込みを
+# それぞれ1クエリ含む（books/generation.py）
+BUDGETS = {
+    'book_list': Budget(max_queries=1, max_upstream_calls=0, max_seconds=1.0),
+    'book_list_by_title': Budget(max_queries=1, max_upstream_calls=0, max_seconds=1.0),
+    'book_list_by_month': Budget(max_queries=1, max_upstream_calls=0, max_seconds=0.5),
+    'book_create': Budget(max_queries=3, max_upstream_calls=2, max_seconds=0.5),
+    'book_create_duplicate': Budget(max_queries=1, max_upstream_calls=0, max_seconds=0.5),
+    'book_delete': Budget(max_queries=3, max_upstream_calls=0, max_seconds=0.5),
+    'book_batch_delete_100': Budget(max_queries=7, max_upstream_calls=0, max_seconds=0.5),
+    'book_search': Budget(max_queries=1, max_upstream_calls=0, max_seconds=0.5),
+    'book_suggest_cold': Budget(max_queries=2, max_upstream_calls=0, max_seconds=0.5),
+    'book_suggest_warm': Budget(max_queries=0, max_upstream_calls=0, max_seconds=0.05),
+    'book_snapshot_cold': Budget(max_queries=2, max_upstream_calls=0, max_seconds=0.5),
+    'book_snapshot_warm': Budget(max_queries=0, max_upstream_calls=0, max_seconds=0.05),
+}
+
+# シードデータの件数
+SEED_BOOKS = 500
+
+NDL_XML = '''\
+<?xml version="1.0" encoding="UTF-8"?>
+<rss version="2.0">
+  <channel>
+    <item>
+      <title>バジェットテストの本</title>
+    </item>
+  </channel>
+</rss>'''.encode('utf-8')
+
+GOOGLE_JSON = {
+    'totalItems': 1,
+    'items': [{'volumeInfo': {'imageLinks': {'thumbnail': 'https://example.com/cover.jpg'}}}],
+}
+
+
+def _fake_upstream_get(url, params=None, timeout=None):
+    """外部APIの代わりに固定のレスポンスを返す"""
+    mock_resp = MagicMock()
+    mock_resp.status_code = 200
+    mock_resp.raise_for_status = MagicMock()
+    if 'ndl' in url:
+        mock_resp.content = NDL_XML
+    else:
+        mock_resp.json.return_value = GOOGLE_JSON
+    return mock_resp
+
+
+def _format_queries(queries, max_queries):
+    """実行されたSQLを一覧化し、上限を超えた分に印をつける"""
+    lines = []
+    for i, query in enumerate(queries, start=1):
+        marker = '+' if i > max_queries else ' '
+        lines.append(f'{marker} {i:>3}: {query["sql"]}')
+    return '\n'.join(lines)
+
+
+class BudgetTestCase(TestCase):
+    """シードデータ上でバジェットを検証するテストの基底クラス"""
+
+    @classmethod
+    def setUpTestData(cls):
+        Book.objects.bulk_create([
+            Book(isbn=f'978{i:010d}', title=f'シードの本 {i:04d}')
+            for i in range(SEED_BOOKS)
+        ])
+
+    def setUp(self):
+        self.client = APIClient()
+        title_index.invalidate()
+        library_snapshot.invalidate()
+        cache.clear()
+
+    def tearDown(self):
+        title_index.invalidate()
+        library_snapshot.invalidate()
+
+    @contextmanager
+    def within_budget(self, name):
+        """ブロック内の処理が BUDGETS[name] の上限内に収まることを検証する"""
+        budget = BUDGETS[name]
+        with patch('books.services.requests.get', side_effect=_fake_upstream_get) as mock_get:
+            with CaptureQueriesContext(connection) as ctx:
+                start = time.perf_counter()
+                yield
+                elapsed = time.perf_counter() - start
+
+        queries = ctx.captured_queries
+        if len(queries) > budget.max_queries:
+            self.fail(
+                f'{name}: SQLクエリ数が上限を超えました '
+                f'({len(queries)} > {budget.max_queries})\n'
+                f'{_format_queries(queries, budget.max_queries)}'
+            )
+        if mock_get.call_count > budget.max_upstream_calls:
+            self.fail(
+                f'{name}: 外部API呼び出し数が上限を超えました '
+                f'({mock_get.call_count} > {budget.max_upstream_calls})\n'
+                + '\n'.join(f'  {c.args[0]} {c.kwargs.get("params")}' for c in mock_get.call_args_list)
+            )
+        if elapsed > budget.max_seconds:
+            self.fail(
+                f'{name}: 処理時間が上限を超えました '
+                f'({elapsed:.3f}s > {budget.max_seconds:.3f}s)'
+            )
+
+
+class EndpointBudgetTest(BudgetTestCase):
+    """既存エンドポイントのバジェットテスト"""
+
+    def test_book_list(self):
+        with self.within_budget('book_list'):
+            response = self.client.get('/api/books/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), SEED_BOOKS)
+
+    def test_book_list_by_title(self):
+        with self.within_budget('book_list_by_title'):
+            response = self.client.get('/api/books/', {'ordering': 'title'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_book_list_by_month(self):
+        with self.within_budget('book_list_by_month'):
+            response = self.client.get('/api/books/', {'month': timezone.localdate().strftime('%Y-%m')})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), SEED_BOOKS)
+
+    def test_book_create(self):
+        with self.within_budget('book_create'):
+            response = self.client.post('/api/books/', {'isbn': '9784999999999'})
+        self.assertEqual(response.status_code, 201)
+
+    def test_book_create_duplicate(self):
+        with self.within_budget('book_create_duplicate'):
+            response = self.client.post('/api/books/', {'isbn': '9780000000001'})
+        self.assertEqual(response.status_code, 409)
+
+    def test_book_delete(self):
+        book = Book.objects.first()
+        with self.within_budget('book_delete'):
+            response = self.client.delete(f'/api/books/{book.pk}/')
+        self.assertEqual(response.status_code, 204)
+
+    def test_book_batch_delete_100(self):
+        pks = list(Book.objects.values_list('pk', flat=True)[:100])
+        operations = [{'op': 'delete', 'id': pk} for pk in pks]
+        with self.within_budget('book_batch_delete_100'):
+            response = self.client.post(
+                '/api/books/batch/', {'operations': operations}, format='json',
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Book.objects.count(), SEED_BOOKS - 100)
+
+    def test_book_search(self):
+        with self.within_budget('book_search'):
+            response = self.client.get('/api/books/search/', {'q': '0001'})
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(len(response.data), 0)
+
+    def test_book_suggest_cold(self):
+        with self.within_budget('book_suggest_cold'):
+            response = self.client.get('/api/books/suggest/', {'q': 'シード'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_book_suggest_warm(self):
+        self.client.get('/api/books/suggest/', {'q': 'シード'})
+        with self.within_budget('book_suggest_warm'):
+            response = self.client.get('/api/books/suggest/', {'q': 'シードの本 01'})
+        self.assertEqual(len(response.data), 10)
+
+    def test_book_snapshot_cold(self):
+        with self.within_budget('book_snapshot_cold'):
+            response = self.client.get('/api/books/snapshot/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 200)
+
+    def test_book_snapshot_warm(self):
+        self.client.get('/api/books/snapshot/', HTTP_ACCEPT_ENCODING='gzip')
+        with self.within_budget('book_snapshot_warm'):
+            response = self.client.get('/api/books/snapshot/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 200)
+
+
+class BudgetHarnessTest(BudgetTestCase):
+    """バジェット違反が検出されることのテスト"""
+
+    def test_query_budget_violation_lists_queries(self):
+        with self.assertRaises(AssertionError) as cm:
+            with self.within_budget('book_suggest_warm'):
+                Book.objects.count()
+        self.assertIn('SQLクエリ数が上限を超えました', str(cm.exception))
+        self.assertIn('+   1: SELECT COUNT(*)', str(cm.exception))
+
+    def test_upstream_budget_violation(self):
+        with self.assertRaises(AssertionError) as cm:
+            with self.within_budget('book_search'):
+                self.client.get('/api/books/search/', {'q': '0001'})
+                fetch_book_from_ndl('9784000000001')
+        self.assertIn('外部API呼び出し数が上限を超えました', str(cm.exception))
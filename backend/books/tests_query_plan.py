@@ -0,0 +1,78 @@
+"""
+一覧・検索クエリの実行計画テスト（PostgreSQLのみ）
+
+実行方法（Dockerコンテナ内）:
+  python manage.py test books.tests_query_plan --verbosity=2
+
+seed_books コマンドで投入したデータに対して、_book_list / book_search が
+発行するSQLを EXPLAIN し、シーケンシャルスキャンではなくインデックスを
+使えることを確認する。テスト用の件数では全件読み込みの方が安くなるため、
+enable_seqscan を無効にして「使えるインデックスがあるか」を検証する。
+"""
+
+from io import StringIO
+from unittest import skipUnless
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+# シードデータの件数
+SEED_BOOKS = 5000
+
+
+@skipUnless(connection.vendor == 'postgresql', 'EXPLAINの検証にはPostgreSQLが必要')
+class BookQueryPlanTest(TestCase):
+    """書籍一覧・検索の実行計画のテスト"""
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('seed_books', count=SEED_BOOKS, seed=1, stdout=StringIO())
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def _explain(self, path, params=None):
+        """APIを呼び出し、発行された書籍テーブルへのSELECTの実行計画を返す"""
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(path, params or {})
+        self.assertEqual(response.status_code, 200)
+
+        plans = []
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            for query in ctx.captured_queries:
+                sql = query['sql']
+                if sql.startswith('SELECT') and 'books_book' in sql:
+                    cursor.execute(f'EXPLAIN {sql}')
+                    plans.append('\n'.join(row[0] for row in cursor.fetchall()))
+        self.assertTrue(plans, 'books_book へのSELECTが発行されていません')
+        return plans
+
+    def assertUsesIndex(self, plans, index_name):
+        for plan in plans:
+            self.assertNotIn('Seq Scan', plan, f'シーケンシャルスキャンが使われています:\n{plan}')
+            self.assertIn(index_name, plan, f'{index_name} が使われていません:\n{plan}')
+
+    def test_list_default_ordering_uses_created_at_index(self):
+        plans = self._explain('/api/books/')
+        self.assertUsesIndex(plans, 'book_created_at_idx')
+
+    def test_list_ordering_created_at_uses_created_at_index(self):
+        plans = self._explain('/api/books/', {'ordering': 'created_at'})
+        self.assertUsesIndex(plans, 'book_created_at_idx')
+
+    def test_list_ordering_title_uses_title_index(self):
+        plans = self._explain('/api/books/', {'ordering': 'title'})
+        self.assertUsesIndex(plans, 'book_title_idx')
+
+    def test_list_month_filter_uses_created_at_index(self):
+        # B-tree（book_created_at_idx）と BRIN（book_created_at_brin_idx）のどちらでもよい
+        plans = self._explain('/api/books/', {'month': '2024-06'})
+        self.assertUsesIndex(plans, 'book_created_at')
+
+    def test_search_uses_trigram_index(self):
+        plans = self._explain('/api/books/search/', {'q': 'ドラゴン'})
+        self.assertUsesIndex(plans, 'book_title_trgm_idx')
@@ -1,9 +1,20 @@
+from importlib import import_module
+
+from django.conf import settings
 from django.urls import path
 
 from . import views
 
+# ASGIで起動した場合は非同期版のビューを使う（config/asgi.py で BOOKS_ASYNC_VIEWS=1）
+# 同期（WSGI）ワーカーでは非同期ビューと httpx を読み込まない
+book_views = import_module('books.async_views') if settings.BOOKS_ASYNC_VIEWS else views
+
 urlpatterns = [
-    path('books/', views.book_list_create, name='book-list-create'),
-    path('books/<int:pk>/', views.book_delete, name='book-delete'),
-    path('books/search/', views.book_search, name='book-search'),
+    path('books/', book_views.book_list_create, name='book-list-create'),
+    path('books/<int:pk>/', book_views.book_delete, name='book-delete'),
+    path('books/search/', book_views.book_search, name='book-search'),
+    path('books/suggest/', views.book_suggest, name='book-suggest'),
+    path('books/snapshot/', views.book_snapshot, name='book-snapshot'),
+    path('books/batch/', views.book_batch, name='book-batch'),
+    path('lookup/<str:isbn>/', book_views.lookup_preview, name='lookup-preview'),
 ]
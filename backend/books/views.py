@@ -1,17 +1,107 @@
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, time, timedelta
 
 import requests
-from django.db import IntegrityError
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.http import parse_etags
 from rest_framework import status
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 
+from .generation import bump_generation
+from .idempotency import idempotent
+from .lookup_cache import shared_lookup
 from .models import Book
-from .serializers import BookSerializer, ISBNSerializer
-from .services import lookup_book_by_isbn
+from .serializers import BatchSerializer, BookSerializer, ISBNSerializer
+from .services import RateLimitExceeded, lookup_book_by_isbn
+from .signals import apply_book_changes
+from .snapshot import library_snapshot
+from .suggest import SUGGEST_DEFAULT_LIMIT, SUGGEST_MAX_LIMIT, suggest_titles
 
 logger = logging.getLogger(__name__)
 
+# 一覧で指定できる並び順
+BOOK_LIST_ORDERINGS = ('title', '-title', 'created_at', '-created_at')
+
+# 一括操作で外部APIを同時に呼び出す最大数
+BATCH_LOOKUP_CONCURRENCY = 4
+
+
+def lookup_error(exc):
+    """外部APIのエラーを返すレスポンスの本文とステータス"""
+    if isinstance(exc, RateLimitExceeded):
+        return (
+            {'error': 'いまはこんでいます。すこしまってからためしてね'},
+            status.HTTP_503_SERVICE_UNAVAILABLE,
+        )
+    if isinstance(exc, requests.exceptions.Timeout):
+        return {'error': 'みつかりませんでした'}, status.HTTP_504_GATEWAY_TIMEOUT
+    if isinstance(exc, requests.exceptions.ConnectionError):
+        return {'error': 'つながりませんでした'}, status.HTTP_502_BAD_GATEWAY
+    return {'error': 'みつかりませんでした'}, status.HTTP_502_BAD_GATEWAY
+
+
+def validated_isbn(data):
+    """リクエストのISBNを検証して正規化したISBNを返す（正しくない場合None）"""
+    if data is None:
+        return None
+    serializer = ISBNSerializer(data=data)
+    if not serializer.is_valid():
+        return None
+    return serializer.validated_data['isbn']
+
+
+def invalid_isbn_error():
+    """ISBNが正しくない場合のレスポンスの本文とステータス"""
+    return {'error': 'ただしいISBNをにゅうりょくしてください'}, status.HTTP_400_BAD_REQUEST
+
+
+def duplicate_error(existing):
+    """登録済みの書籍があった場合のレスポンスの本文とステータス"""
+    return (
+        {'error': 'このほんはもうとうろくされています', 'book': BookSerializer(existing).data},
+        status.HTTP_409_CONFLICT,
+    )
+
+
+def not_found_error():
+    """外部APIで書籍が見つからなかった場合のレスポンスの本文とステータス"""
+    return {'error': 'みつかりませんでした'}, status.HTTP_404_NOT_FOUND
+
+
+def create_error(exc):
+    """書籍の保存に失敗した場合のレスポンスの本文とステータス"""
+    if isinstance(exc, IntegrityError):
+        return {'error': 'このほんはもうとうろくされています'}, status.HTTP_409_CONFLICT
+    logger.error('Book creation failed', exc_info=exc)
+    return {'error': 'エラーがおきました'}, status.HTTP_500_INTERNAL_SERVER_ERROR
+
+
+def new_book_fields(isbn, book_info):
+    """外部APIの検索結果から登録する書籍の項目を作る"""
+    return {
+        'isbn': isbn,
+        'title': book_info['title'],
+        'cover_image_url': book_info.get('cover_image_url'),
+    }
+
+
+def preview_result(isbn, book_info):
+    """登録前のプレビューのレスポンスの本文とステータス"""
+    if book_info is None:
+        return not_found_error()
+    return {
+        'isbn': isbn,
+        'title': book_info['title'],
+        'cover_image_url': book_info.get('cover_image_url'),
+    }, status.HTTP_200_OK
+
 
 @api_view(['GET', 'POST'])
 def book_list_create(request):
@@ -21,85 +111,131 @@ def book_list_create(request):
     return _book_create(request)
 
 
+@idempotent
 def _book_create(request):
     """書籍登録: ISBN受取→外部API検索→DB保存→結果返却"""
-    serializer = ISBNSerializer(data=request.data)
-    if not serializer.is_valid():
-        return Response(
-            {'error': 'ただしいISBNをにゅうりょくしてください'},
-            status=status.HTTP_400_BAD_REQUEST,
-        )
-
-    isbn = serializer.validated_data['isbn']
+    isbn = validated_isbn(request.data)
+    if isbn is None:
+        return Response(*invalid_isbn_error())
 
     # 重複チェック
     existing = Book.objects.filter(isbn=isbn).first()
     if existing:
-        return Response(
-            {'error': 'このほんはもうとうろくされています', 'book': BookSerializer(existing).data},
-            status=status.HTTP_409_CONFLICT,
-        )
+        return Response(*duplicate_error(existing))
 
     # 外部APIから書籍情報を取得
+    # （プレビューで検索済みの場合は保存した結果を使い、外部APIを呼ばない）
     try:
-        book_info = lookup_book_by_isbn(isbn)
-    except requests.exceptions.Timeout:
-        return Response(
-            {'error': 'みつかりませんでした'},
-            status=status.HTTP_504_GATEWAY_TIMEOUT,
-        )
-    except requests.exceptions.ConnectionError:
-        return Response(
-            {'error': 'つながりませんでした'},
-            status=status.HTTP_502_BAD_GATEWAY,
-        )
-    except requests.exceptions.RequestException:
-        return Response(
-            {'error': 'みつかりませんでした'},
-            status=status.HTTP_502_BAD_GATEWAY,
-        )
+        book_info = shared_lookup(isbn, lookup_book_by_isbn)
+    except requests.exceptions.RequestException as exc:
+        return Response(*lookup_error(exc))
 
     if book_info is None:
-        return Response(
-            {'error': 'みつかりませんでした'},
-            status=status.HTTP_404_NOT_FOUND,
-        )
+        return Response(*not_found_error())
 
     # DB保存
     try:
-        book = Book.objects.create(
-            isbn=isbn,
-            title=book_info['title'],
-            cover_image_url=book_info.get('cover_image_url'),
-        )
-    except IntegrityError:
-        return Response(
-            {'error': 'このほんはもうとうろくされています'},
-            status=status.HTTP_409_CONFLICT,
-        )
-    except Exception:
-        logger.exception('Book creation failed')
-        return Response(
-            {'error': 'エラーがおきました'},
-            status=status.HTTP_500_INTERNAL_SERVER_ERROR,
-        )
+        book = Book.objects.create(**new_book_fields(isbn, book_info))
+    except Exception as exc:
+        return Response(*create_error(exc))
 
     return Response(BookSerializer(book).data, status=status.HTTP_201_CREATED)
 
 
+def _parse_moment(value, end_of_day=False):
+    """日付（YYYY-MM-DD）または日時（ISO 8601）をタイムゾーン付きの日時にする
+
+    日付の場合はその日の0時（end_of_day=True の場合は翌日の0時）を返す。
+    """
+    day = parse_date(value)
+    if day is not None:
+        if end_of_day:
+            day += timedelta(days=1)
+        return timezone.make_aware(datetime.combine(day, time.min))
+    moment = parse_datetime(value)
+    if moment is None:
+        raise ValueError(value)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def created_at_filters(params):
+    """一覧の登録日時の絞り込み（since / until / month）を filter() の引数にする
+
+    since: この日時以降（日付の場合はその日の0時から）
+    until: この日時まで（日付の場合はその日の終わりまで）
+    month: YYYY-MM の月（TIME_ZONE の月初から翌月の月初の前まで）
+    __month などの関数による絞り込みはインデックスを使えないため、
+    すべて created_at の範囲（>= / < / <=）に変換する。
+
+    Raises:
+        ValueError: 日付・月の形式が正しくない場合
+    """
+    filters = {}
+    since, until, month = params.get('since'), params.get('until'), params.get('month')
+    if since:
+        filters['created_at__gte'] = _parse_moment(since)
+    if until:
+        if parse_date(until) is not None:
+            filters['created_at__lt'] = _parse_moment(until, end_of_day=True)
+        else:
+            filters['created_at__lte'] = _parse_moment(until)
+    if month:
+        year, _, month_number = month.partition('-')
+        if not (len(year) == 4 and year.isdigit() and month_number.isdigit()):
+            raise ValueError(month)
+        start = date(int(year), int(month_number), 1)
+        end = date(start.year + start.month // 12, start.month % 12 + 1, 1)
+        start_at = timezone.make_aware(datetime.combine(start, time.min))
+        end_at = timezone.make_aware(datetime.combine(end, time.min))
+        filters['created_at__gte'] = max(filters.get('created_at__gte', start_at), start_at)
+        filters['created_at__lt'] = min(filters.get('created_at__lt', end_at), end_at)
+    return filters
+
+
 def _book_list(request):
-    """書籍一覧: 並び順パラメータ対応（登録日時順 / タイトル50音順）"""
+    """書籍一覧: 並び順パラメータ対応（登録日時順 / タイトル50音順）と登録日時での絞り込み"""
     ordering = request.query_params.get('ordering', '-created_at')
+    if ordering not in BOOK_LIST_ORDERINGS:
+        ordering = '-created_at'
 
-    if ordering in ('title', '-title', 'created_at', '-created_at'):
-        books = Book.objects.all().order_by(ordering)
-    else:
-        books = Book.objects.all().order_by('-created_at')
+    try:
+        filters = created_at_filters(request.query_params)
+    except ValueError:
+        return Response(
+            {'error': 'ただしくないリクエストです'},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    books = Book.objects.filter(**filters).order_by(ordering)
 
     serializer = BookSerializer(books, many=True)
     return Response(serializer.data)
 
 
+@api_view(['GET'])
+def lookup_preview(request, isbn):
+    """登録前のプレビュー: バーコード読み取り直後に外部APIを検索して結果を返す
+
+    結果は一時保存され、続く POST /api/books/ は外部APIを呼ばずに登録できる。
+    """
+    isbn = validated_isbn({'isbn': isbn})
+    if isbn is None:
+        return Response(*invalid_isbn_error())
+
+    existing = Book.objects.filter(isbn=isbn).first()
+    if existing:
+        return Response(*duplicate_error(existing))
+
+    try:
+        book_info = shared_lookup(isbn, lookup_book_by_isbn)
+    except requests.exceptions.RequestException as exc:
+        return Response(*lookup_error(exc))
+
+    return Response(*preview_result(isbn, book_info))
+
+
 @api_view(['DELETE'])
 def book_delete(request, pk):
     """書籍削除: 指定IDの書籍を削除"""
@@ -115,6 +251,135 @@ def book_delete(request, pk):
     return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+@api_view(['POST'])
+def book_batch(request):
+    """一括操作: 削除（id / ISBN指定）と書籍情報の再取得をまとめて1トランザクションで行う
+
+    対象の取得・ロック・削除・更新はそれぞれ1回のクエリで行うため、件数によらずクエリ数は一定。
+    結果は操作ごとに operations と同じ順で返す。同じ書籍を再取得した後に削除した場合、
+    再取得の結果は skipped になる。再取得ではレート制限のトークンを待たず、
+    足りなかった書籍は status=error, retryable=true で返す（クライアントは後で送り直す）。
+    """
+    serializer = BatchSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(
+            {'error': 'ただしくないリクエストです'},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    operations = serializer.validated_data['operations']
+
+    ids = {op['id'] for op in operations if 'id' in op}
+    isbns = {op['isbn'] for op in operations if 'isbn' in op}
+    books = list(Book.objects.filter(Q(pk__in=ids) | Q(isbn__in=isbns)))
+    by_id = {book.pk: book for book in books}
+    by_isbn = {book.isbn: book for book in books}
+
+    def target(op):
+        if 'id' in op:
+            return by_id.get(op['id'])
+        return by_isbn.get(op['isbn'])
+
+    # 再取得は外部APIの待ち時間が長いため、トランザクションの外で先にまとめて行う
+    relookup_isbns = sorted({
+        target(op).isbn for op in operations
+        if op['op'] == 'relookup' and target(op) is not None
+    })
+    lookups = {}
+    if relookup_isbns:
+        with ThreadPoolExecutor(max_workers=BATCH_LOOKUP_CONCURRENCY) as executor:
+            lookups = dict(zip(relookup_isbns, executor.map(_safe_lookup, relookup_isbns)))
+
+    results = []
+    results_by_pk = {}  # id -> その書籍に対する操作の結果
+    deleted = set()
+    updated = {}
+    now = timezone.now()
+    for op in operations:
+        book = target(op)
+        result = {'op': op['op'], 'id': op.get('id'), 'isbn': op.get('isbn')}
+        results.append(result)
+        if book is None or book.pk in deleted:
+            result['status'] = 'not_found'
+            continue
+
+        result['id'], result['isbn'] = book.pk, book.isbn
+        if op['op'] == 'delete':
+            # 先に行った再取得は反映されないため、その結果を skipped に書き換える
+            for earlier in results_by_pk.pop(book.pk, []):
+                earlier.pop('book', None)
+                earlier.pop('error', None)
+                earlier['status'] = 'skipped'
+            deleted.add(book.pk)
+            updated.pop(book.pk, None)
+            result['status'] = 'deleted'
+            results_by_pk[book.pk] = [result]
+            continue
+
+        results_by_pk.setdefault(book.pk, []).append(result)
+
+        info = lookups[book.isbn]
+        if isinstance(info, requests.exceptions.RequestException):
+            result['status'] = 'error'
+            result['error'] = lookup_error(info)[0]['error']
+            result['retryable'] = isinstance(info, RateLimitExceeded)
+            continue
+        if info is None:
+            result['status'] = 'not_found'
+            continue
+        # 取得できなかった表紙画像で既存のURLを消さない
+        cover = info.get('cover_image_url') or book.cover_image_url
+        result['status'] = 'unchanged'
+        if info['title'] != book.title or cover != book.cover_image_url:
+            book.title, book.cover_image_url = info['title'], cover
+            result['status'] = 'updated'
+        book.refreshed_at = now
+        updated[book.pk] = book
+        result['book'] = BookSerializer(book).data
+
+    with transaction.atomic():
+        # 対象をロックして読み直す（取得後に別のリクエストで削除された書籍は not_found にする）
+        targets = deleted | set(updated)
+        existing = set()
+        if targets:
+            existing = set(
+                Book.objects.select_for_update().filter(pk__in=targets).values_list('pk', flat=True)
+            )
+        for pk in targets - existing:
+            for result in results_by_pk[pk]:
+                result.pop('book', None)
+                result.pop('error', None)
+                result['status'] = 'not_found'
+        deleted &= existing
+        updated = {pk: book for pk, book in updated.items() if pk in existing}
+
+        if deleted:
+            Book.objects.filter(pk__in=deleted).delete()
+        if updated:
+            changed = list(updated.values())
+            Book.objects.bulk_update(changed, ['title', 'cover_image_url', 'refreshed_at'])
+            # bulk_update はシグナルを送らないため、世代番号をここで進め、
+            # 自分のプロセスのタイトル候補とスナップショットにはコミット後に反映する
+            saved = [
+                (book.pk, book.title, book.isbn, book.cover_image_url) for book in changed
+            ]
+            generation = bump_generation()
+            transaction.on_commit(lambda: apply_book_changes(generation, saved=saved))
+
+    return Response({'results': results})
+
+
+def _safe_lookup(isbn):
+    """一括再取得用: 外部APIの例外を結果として返す
+
+    件数が多いとレート制限の待ち時間がクライアントのタイムアウトを超えるため、
+    トークンを待たずに RateLimitExceeded を返す。
+    """
+    try:
+        return lookup_book_by_isbn(isbn, block=False)
+    except requests.exceptions.RequestException as exc:
+        return exc
+
+
 @api_view(['GET'])
 def book_search(request):
     """書籍検索: タイトル部分一致検索"""
@@ -126,3 +391,50 @@ def book_search(request):
     books = Book.objects.filter(title__icontains=query).order_by('-created_at')
     serializer = BookSerializer(books, many=True)
     return Response(serializer.data)
+
+
+@api_view(['GET'])
+def book_suggest(request):
+    """タイトル候補: 入力途中のタイトルに前方一致する候補を返す（インクリメンタル検索用）"""
+    query = request.query_params.get('q', '').strip()
+
+    if not query:
+        return Response([])
+
+    try:
+        limit = int(request.query_params.get('limit', SUGGEST_DEFAULT_LIMIT))
+    except ValueError:
+        limit = SUGGEST_DEFAULT_LIMIT
+    limit = max(1, min(limit, SUGGEST_MAX_LIMIT))
+
+    return Response(suggest_titles(query, limit))
+
+
+@api_view(['GET'])
+def book_snapshot(request):
+    """蔵書スナップショット: クライアント側で検索できるよう id・タイトル・照合用キー・ISBN をまとめて返す
+
+    生成済みのgzip圧縮データをそのまま返し、ETag が一致する場合は 304 を返す。
+    """
+    artifact = library_snapshot.artifact()
+    if artifact is None:
+        # 件数が多い場合はサーバー側の検索（/api/books/search/）を使ってもらう
+        return Response(
+            {'error': 'みつかりませんでした'},
+            status=status.HTTP_404_NOT_FOUND,
+        )
+
+    gzipped = 'gzip' in request.headers.get('Accept-Encoding', '')
+    etag = f'"{artifact.version}-gzip"' if gzipped else f'"{artifact.version}"'
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+    elif gzipped:
+        response = HttpResponse(artifact.compressed, content_type='application/json')
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = HttpResponse(artifact.content, content_type='application/json')
+    response['ETag'] = etag
+    # キャッシュしてよいが、使う前に毎回 ETag で確認してもらう
+    response['Cache-Control'] = 'no-cache'
+    patch_vary_headers(response, ['Accept-Encoding'])
+    return response
@@ -0,0 +1,12 @@
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+# ASGIでは書籍APIを非同期ビューで処理する
+os.environ.setdefault('BOOKS_ASYNC_VIEWS', '1')
+# Django 4.2 のASGIはリクエストごとに別スレッドでDB接続を持つため、
+# 永続接続を使うと接続が残り続ける。接続の再利用は PgBouncer などのプーラーに任せる
+os.environ.setdefault('POSTGRES_CONN_MAX_AGE', '0')
+
+application = get_asgi_application()
@@ -0,0 +1,153 @@
+import contextvars
+import itertools
+import logging
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+# 書き込み直後に読み取りをプライマリに固定するためのCookie名
+PIN_COOKIE_NAME = 'db_pin_primary'
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class _RoutingState:
+    """リクエストごとの振り分け状態"""
+
+    def __init__(self, allow_replica):
+        self.allow_replica = allow_replica
+        self.replica = None
+        self.wrote = False
+
+
+_routing_state = contextvars.ContextVar('db_routing_state', default=None)
+
+_round_robin = itertools.count()
+_health_lock = threading.Lock()
+_health = {}  # alias -> (正常かどうか, 確認した時刻)
+
+
+def _is_healthy(alias):
+    """レプリカに接続できるか確認する（結果は一定時間キャッシュする）"""
+    interval = getattr(settings, 'DATABASE_REPLICA_HEALTH_CHECK_INTERVAL', 10)
+    now = time.monotonic()
+    with _health_lock:
+        cached = _health.get(alias)
+    if cached is not None and now - cached[1] < interval:
+        return cached[0]
+
+    try:
+        with connections[alias].cursor() as cursor:
+            cursor.execute('SELECT 1')
+        healthy = True
+    except DatabaseError:
+        logger.warning('Database replica is unavailable: %s', alias)
+        connections[alias].close()
+        healthy = False
+
+    with _health_lock:
+        _health[alias] = (healthy, now)
+    return healthy
+
+
+def _choose_replica():
+    """正常なレプリカをラウンドロビンで選ぶ（なければNone）"""
+    replicas = list(getattr(settings, 'DATABASE_REPLICAS', []))
+    if not replicas:
+        return None
+    start = next(_round_robin)
+    for i in range(len(replicas)):
+        alias = replicas[(start + i) % len(replicas)]
+        if _is_healthy(alias):
+            return alias
+    return None
+
+
+class ReplicaRouter:
+    """読み取り専用のリクエストをレプリカに振り分けるデータベースルーター
+
+    ReplicaRoutingMiddleware が有効なリクエスト内で、かつ安全なメソッド（GET等）で
+    書き込み直後の固定がない場合のみレプリカを使う。1リクエスト内では同じレプリカを使う。
+    それ以外（管理コマンド・書き込みリクエスト・レプリカ障害時）はプライマリを使う。
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _routing_state.get()
+        if state is None or not state.allow_replica:
+            return 'default'
+        if state.replica is None:
+            state.replica = _choose_replica() or 'default'
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _routing_state.get()
+        if state is not None:
+            # 書き込み後の読み取りはプライマリから行う
+            state.allow_replica = False
+            state.wrote = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
+
+
+class ReplicaRoutingMiddleware:
+    """リクエストごとにレプリカの利用可否を決め、書き込み後はCookieでプライマリに固定する
+
+    振り分け状態は contextvars で持つため、非同期ビューでも sync_to_async で実行される
+    クエリに引き継がれる（ASGIではイベントループ上でそのまま動く）。
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = self._state_for(request)
+        token = _routing_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _routing_state.reset(token)
+        return self._pin_after_write(state, response)
+
+    async def __acall__(self, request):
+        """__call__ の非同期版"""
+        state = self._state_for(request)
+        token = _routing_state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _routing_state.reset(token)
+        return self._pin_after_write(state, response)
+
+    def _state_for(self, request):
+        allow_replica = (
+            request.method in SAFE_METHODS
+            and PIN_COOKIE_NAME not in request.COOKIES
+        )
+        return _RoutingState(allow_replica)
+
+    def _pin_after_write(self, state, response):
+        if state.wrote:
+            # レプリカの遅延より長い間、同じクライアントの読み取りをプライマリに向ける
+            response.set_cookie(
+                PIN_COOKIE_NAME, '1',
+                max_age=getattr(settings, 'DATABASE_REPLICA_PIN_SECONDS', 5),
+                httponly=True, samesite='Lax',
+            )
+        return response
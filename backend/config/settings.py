@@ -1,6 +1,8 @@
 import os
 from pathlib import Path
 
+from corsheaders.defaults import default_headers
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 SECRET_KEY = os.environ.get(
@@ -25,6 +27,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'books.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -54,6 +57,10 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'config.wsgi.application'
+ASGI_APPLICATION = 'config.asgi.application'
+
+# 書籍APIを非同期ビュー（books/async_views.py）で処理する（config/asgi.py で有効になる）
+BOOKS_ASYNC_VIEWS = os.environ.get('BOOKS_ASYNC_VIEWS', '0') == '1'
 
 DATABASES = {
     'default': {
@@ -63,9 +70,54 @@ DATABASES = {
         'PASSWORD': os.environ.get('POSTGRES_PASSWORD', 'password'),
         'HOST': os.environ.get('POSTGRES_HOST', 'db'),
         'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+        # リクエストごとに接続し直さないよう接続を使い回し、再利用前に死活確認する
+        'CONN_MAX_AGE': int(os.environ.get('POSTGRES_CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# 読み取り専用レプリカ（任意）
+# POSTGRES_REPLICA_HOSTS にカンマ区切りでホストを指定すると、一覧・検索などの
+# GETリクエストをレプリカに振り分ける（接続情報はプライマリと同じものを使う）
+DATABASE_REPLICAS = []
+for _i, _host in enumerate(
+    [h.strip() for h in os.environ.get('POSTGRES_REPLICA_HOSTS', '').split(',') if h.strip()],
+    start=1,
+):
+    DATABASES[f'replica{_i}'] = {
+        **DATABASES['default'],
+        'HOST': _host,
+        'OPTIONS': {'connect_timeout': 2},
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica{_i}')
+
+if DATABASE_REPLICAS:
+    DATABASE_ROUTERS = ['config.db_router.ReplicaRouter']
+    MIDDLEWARE.append('config.db_router.ReplicaRoutingMiddleware')
+
+# 書き込み後に同じクライアントの読み取りをプライマリに固定する秒数
+DATABASE_REPLICA_PIN_SECONDS = 5
+# レプリカの死活確認の間隔（秒）
+DATABASE_REPLICA_HEALTH_CHECK_INTERVAL = 10
+
+# キャッシュ設定
+# 複数プロセスで状態（外部APIのレート制限など）を共有する場合は
+# Redis / Memcached / DatabaseCache などの共有バックエンドを指定する
+# （docker-compose.yml では DatabaseCache を使う。テーブルは createcachetable で作成する）
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get(
+            'DJANGO_CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache',
+        ),
+        'LOCATION': os.environ.get('DJANGO_CACHE_LOCATION', ''),
+    }
+}
+
+# テストではキャッシュの設定によらずプロセス内のキャッシュを使う
+TEST_RUNNER = 'config.test_runner.LocalCacheTestRunner'
+
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
     {'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator'},
@@ -90,6 +142,10 @@ CORS_ALLOWED_ORIGINS = [
     'http://localhost:3000',
     'http://127.0.0.1:3000',
 ]
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
+# レプリカ利用時にプライマリ固定のCookieを送受信するため
+CORS_ALLOW_CREDENTIALS = True
+CORS_EXPOSE_HEADERS = ['Idempotent-Replayed']
 
 # REST Framework設定
 REST_FRAMEWORK = {
@@ -98,3 +154,30 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.AllowAny',
     ],
 }
+
+# 外部APIのレート制限（トークンバケット）
+# rate: 1秒あたりに補充される呼び出し回数, capacity: 連続して呼び出せる回数
+UPSTREAM_RATE_LIMITS = {
+    'ndl': {'rate': 1.0, 'capacity': 5},
+    'google_books': {'rate': 1.0, 'capacity': 5},
+}
+# True: 上限に達したらトークンの補充を待つ / False: 即座にエラーにする
+UPSTREAM_RATE_LIMIT_BLOCK = True
+# 待機する最大秒数
+UPSTREAM_RATE_LIMIT_TIMEOUT = 3
+
+# 書籍登録の Idempotency-Key で保存したレスポンスの保持時間（秒）
+IDEMPOTENCY_KEY_TTL = 60 * 60 * 24
+
+# 登録前のプレビュー（GET /api/lookup/<isbn>/）で検索した結果の保持時間（秒）
+LOOKUP_CACHE_TTL = 60 * 5
+
+# リクエスト単位のプロファイリング（books/profiling.py）
+# 有効時は X-Profile ヘッダーに許可したトークンを付けたリクエスト、
+# または PROFILING_SAMPLE_RATE の割合で抽出したリクエストを計測する
+PROFILING_ENABLED = os.environ.get('DJANGO_PROFILING', '0') == '1'
+PROFILING_HEADER_TOKENS = [
+    t for t in os.environ.get('DJANGO_PROFILING_TOKENS', '').split(',') if t
+]
+PROFILING_SAMPLE_RATE = float(os.environ.get('DJANGO_PROFILING_SAMPLE_RATE', '0'))
+PROFILING_OUTPUT_DIR = os.environ.get('DJANGO_PROFILING_DIR', str(BASE_DIR / 'profiles'))
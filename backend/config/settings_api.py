@@ -0,0 +1,52 @@
+"""
+API専用の軽量な設定
+
+本番のAPIワーカーで DJANGO_SETTINGS_MODULE=config.settings_api として使う。
+config/settings.py を読み込んだうえで、書籍APIが使わない次のものを外す。
+  - 管理画面・認証・セッション・メッセージ・静的ファイルのアプリ
+  - それらのミドルウェアと CSRF / クリックジャッキング対策（Cookie認証を使わないJSON API のため）
+  - テンプレートと DRF のブラウザ用画面（JSONだけを返す）
+起動時間と1リクエストあたりのミドルウェアの処理時間は
+benchmarks/bench_settings_profiles.py で比較できる。
+管理画面や runserver での開発には従来どおり config.settings を使う。
+"""
+
+import os
+
+from .settings import *  # noqa: F401,F403
+from .settings import INSTALLED_APPS, MIDDLEWARE, REST_FRAMEWORK
+
+DEBUG = os.environ.get('DJANGO_DEBUG', '0') == '1'
+
+# 書籍APIが使わないアプリとミドルウェア
+UNUSED_APPS = (
+    'django.contrib.admin',
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
+)
+UNUSED_MIDDLEWARE = (
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+)
+
+INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in UNUSED_APPS]
+MIDDLEWARE = [m for m in MIDDLEWARE if m not in UNUSED_MIDDLEWARE]
+
+TEMPLATES = []
+
+AUTH_PASSWORD_VALIDATORS = []
+
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,
+    'DEFAULT_RENDERER_CLASSES': [
+        'rest_framework.renderers.JSONRenderer',
+    ],
+    # django.contrib.auth を読み込まないよう、未認証ユーザーは AnonymousUser ではなく None にする
+    'UNAUTHENTICATED_USER': None,
+}
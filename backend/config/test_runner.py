@@ -0,0 +1,25 @@
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+# テストで使うキャッシュ（プロセス内）
+TEST_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+}
+
+
+class LocalCacheTestRunner(DiscoverRunner):
+    """キャッシュを常にプロセス内のものにしてテストを実行する
+
+    docker-compose.yml ではキャッシュにDB（DatabaseCache）を使うが、その場合は
+    キャッシュの読み書きがクエリ数の検証に数えられ、スレッドを使うテストもDBのロックで
+    失敗する。環境変数のキャッシュ設定によらず同じ結果になるようにする。
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._caches = override_settings(CACHES=TEST_CACHES)
+        self._caches.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._caches.disable()
+        super().teardown_test_environment(**kwargs)
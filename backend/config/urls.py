@@ -1,7 +1,12 @@
-from django.contrib import admin
+from django.apps import apps
 from django.urls import include, path
 
 urlpatterns = [
-    path('admin/', admin.site.urls),
     path('api/', include('books.urls')),
 ]
+
+# API専用の設定（config/settings_api.py）では管理画面を読み込まない
+if apps.is_installed('django.contrib.admin'):
+    from django.contrib import admin
+
+    urlpatterns.insert(0, path('admin/', admin.site.urls))
@@ -1,13 +1,14 @@
 import React, { useEffect, useRef, useState } from 'react';
 import { Link } from 'react-router-dom';
 import { Html5Qrcode } from 'html5-qrcode';
-import { registerBook, getErrorMessage } from '../services/api';
+import { previewBook, registerBook, getErrorMessage } from '../services/api';
 import './RegisterBarcode.css';
 
 function RegisterBarcode() {
   const [message, setMessage] = useState(null);
   const [messageType, setMessageType] = useState('');
   const [registeredBook, setRegisteredBook] = useState(null);
+  const [previewedBook, setPreviewedBook] = useState(null);
   const [scanning, setScanning] = useState(false);
   const [loading, setLoading] = useState(false);
   const scannerRef = useRef(null);
@@ -37,6 +38,27 @@ function RegisterBarcode() {
     setLoading(true);
     setMessage(null);
     setRegisteredBook(null);
+    setPreviewedBook(null);
+
+    // 確認しているあいだに書籍情報を検索しておく
+    try {
+      const response = await previewBook(isbn);
+      setPreviewedBook(response.data);
+    } catch (err) {
+      setMessage(getErrorMessage(err));
+      setMessageType('error');
+      if (err.response?.status === 409 && err.response?.data?.book) {
+        setRegisteredBook(err.response.data.book);
+      }
+    } finally {
+      setLoading(false);
+    }
+  };
+
+  const handleConfirm = async () => {
+    const { isbn } = previewedBook;
+    setPreviewedBook(null);
+    setLoading(true);
 
     try {
       const response = await registerBook(isbn);
@@ -57,6 +79,7 @@ function RegisterBarcode() {
   const startScanner = async () => {
     setMessage(null);
     setRegisteredBook(null);
+    setPreviewedBook(null);
 
     const html5Qrcode = new Html5Qrcode('barcode-reader');
     scannerRef.current = html5Qrcode;
@@ -88,7 +111,7 @@ function RegisterBarcode() {
 
       <div id="barcode-reader" ref={readerRef} className="barcode-reader" />
 
-      {!scanning && !loading && (
+      {!scanning && !loading && !previewedBook && (
         <button className="btn btn-pink scanner-btn" onClick={startScanner}>
           カメラをひらく
         </button>
@@ -108,6 +131,25 @@ function RegisterBarcode() {
         </p>
       )}
 
+      {previewedBook && (
+        <div className="registered-book">
+          {previewedBook.cover_image_url && (
+            <img
+              src={previewedBook.cover_image_url}
+              alt={previewedBook.title}
+              className="registered-book-cover"
+            />
+          )}
+          <p className="registered-book-title">{previewedBook.title}</p>
+          <button className="btn btn-pink scanner-btn" onClick={handleConfirm}>
+            とうろくする
+          </button>
+          <button className="btn btn-gray scanner-btn" onClick={startScanner}>
+            べつのほんにする
+          </button>
+        </div>
+      )}
+
       {registeredBook && (
         <div className="registered-book">
           {registeredBook.cover_image_url && (
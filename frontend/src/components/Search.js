@@ -1,17 +1,45 @@
-import React, { useState } from 'react';
+import React, { useEffect, useState } from 'react';
 import { Link } from 'react-router-dom';
-import { searchBooks, getErrorMessage } from '../services/api';
+import { getLibrarySnapshot, searchBooks, getErrorMessage } from '../services/api';
 import './Search.css';
 
+// スナップショット（[id, タイトル, 照合用キー, ISBN, 表紙画像URL] の配列）を部分一致で検索する
+// 照合用キーはサーバーで NFKC・toLowerCase と同じ規則で正規化してあるため、
+// 検索語も同じ規則で正規化して比べ、表示には元のタイトルを使う
+function searchSnapshot(books, query) {
+  const normalized = query.normalize('NFKC').toLowerCase();
+  return books
+    .filter(([, , key]) => key.includes(normalized))
+    .sort((a, b) => b[0] - a[0])
+    .map(([id, title, , isbn, cover]) => ({ id, title, isbn, cover_image_url: cover }));
+}
+
 function Search() {
   const [query, setQuery] = useState('');
   const [results, setResults] = useState([]);
   const [searched, setSearched] = useState(false);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState(null);
+  const [snapshot, setSnapshot] = useState(null);
+
+  // 蔵書のスナップショットを1回だけ取得し、以降の検索は端末内で行う
+  // （取得できない場合はこれまでどおりサーバーで検索する）
+  useEffect(() => {
+    getLibrarySnapshot()
+      .then((response) => setSnapshot(response.data.books))
+      .catch(() => {});
+  }, []);
 
   const handleSearch = async () => {
-    if (!query.trim()) return;
+    const current = query.trim();
+    if (!current) return;
+
+    if (snapshot) {
+      setResults(searchSnapshot(snapshot, current));
+      setSearched(true);
+      setError(null);
+      return;
+    }
 
     setLoading(true);
     setError(null);
@@ -3,6 +3,8 @@ import axios from 'axios';
 const api = axios.create({
   baseURL: 'http://localhost:8000/api',
   timeout: 10000,
+  // 登録・削除直後の一覧がレプリカの遅延で古くならないよう、サーバーのCookieを送る
+  withCredentials: true,
 });
 
 // ネットワークエラー・タイムアウトをひらがなメッセージに変換
@@ -28,18 +30,52 @@ export function getErrorMessage(err) {
   return 'エラーがおきました';
 }
 
-export function registerBook(isbn) {
-  return api.post('/books/', { isbn });
+// 再送しても二重に登録・検索されないよう、登録ごとに一意のキーを付ける
+// （家庭内Wi-FiのHTTP環境では crypto.randomUUID が使えないため自前で生成する）
+function newIdempotencyKey() {
+  return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
 }
 
-export function getBooks(ordering = '-created_at') {
-  return api.get('/books/', { params: { ordering } });
+// バーコード読み取り直後に書籍情報を先に検索しておく（結果はサーバーに一時保存され、
+// 続く registerBook は外部APIを待たずに終わる）
+export function previewBook(isbn) {
+  return api.get(`/lookup/${isbn}/`);
+}
+
+// タイムアウト・通信エラーのときは同じキーで1回だけ再送する
+export async function registerBook(isbn) {
+  const headers = { 'Idempotency-Key': newIdempotencyKey() };
+  try {
+    return await api.post('/books/', { isbn }, { headers });
+  } catch (err) {
+    if (err.response) throw err;
+    return api.post('/books/', { isbn }, { headers });
+  }
+}
+
+// filters: { since, until }（YYYY-MM-DD）または { month }（YYYY-MM）で登録日時を絞り込む
+export function getBooks(ordering = '-created_at', filters = {}) {
+  return api.get('/books/', { params: { ordering, ...filters } });
 }
 
 export function deleteBook(id) {
   return api.delete(`/books/${id}/`);
 }
 
+// operations: [{ op: 'delete' | 'relookup', id } または { op, isbn }]
+export function batchBooks(operations) {
+  return api.post('/books/batch/', { operations });
+}
+
 export function searchBooks(query) {
   return api.get('/books/search/', { params: { q: query } });
 }
+
+// 蔵書の id・タイトル・照合用キー・ISBN・表紙画像URL をまとめたスナップショット（端末側の検索用）
+export function getLibrarySnapshot() {
+  return api.get('/books/snapshot/');
+}
+
+export function suggestBooks(query) {
+  return api.get('/books/suggest/', { params: { q: query } });
+}